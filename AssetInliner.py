@@ -0,0 +1,165 @@
+import base64, mimetypes, os, re, threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# matches a complete <link> or <img> start tag
+TAG_PATTERN = re.compile(r"<(link|img)\b[^>]*>", re.IGNORECASE)
+# matches one attribute of a start tag, with double, single or no quotes
+ATTRIBUTE_PATTERN = re.compile(r"""([^\s=/>]+)\s*=\s*("[^"]*"|'[^']*'|[^\s>]+)""")
+# matches the inline_css and inline_image template globals called with a literal path
+GLOBAL_CALL_PATTERN = re.compile(r"""\binline_(?:css|image)\(\s*("[^"]*"|'[^']*')\s*\)""")
+
+
+def _attributes(tag: str) -> dict:
+    return {name.lower(): value.strip("\"'") for name, value in ATTRIBUTE_PATTERN.findall(tag)}
+
+
+def _read_css(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def _read_image_data_uri(path: str) -> str:
+    mime_type = mimetypes.guess_type(path)[0] or "image/png"
+    with open(path, "rb") as f:
+        return f"data:{mime_type};base64," + base64.b64encode(f.read()).decode()
+
+
+class AssetCache:
+    def __init__(self):
+        """
+        Caches the inlined form of stylesheets and images, keyed by path and validated by
+        modification time and size, so unchanged files are read and encoded only once.
+        """
+        # (kind, absolute path) -> (modification time in ns, size, inlined content)
+        self._entries: Dict[Tuple[str, str], Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def css(self, path: str) -> str:
+        """ Returns the text of a stylesheet. """
+        return self.__get("css", path, _read_css)
+
+    def image_data_uri(self, path: str) -> str:
+        """ Returns an image as base64 data uri. """
+        return self.__get("img", path, _read_image_data_uri)
+
+    def stamps(self, paths: Iterable[str]) -> List[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Returns the modification time and size of each file, so callers can tell whether inlined content changed.
+
+        Args:
+            paths (Iterable[str]): The asset paths, e.g. from asset_references.
+
+        Returns:
+            List[Tuple[str, Optional[int], Optional[int]]]: The absolute path, modification time in ns and size
+                of each file, time and size are None for files that do not exist.
+        """
+        stamps = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                stamps.append((os.path.abspath(path), stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamps.append((os.path.abspath(path), None, None))
+        return stamps
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __get(self, kind: str, path: str, read: Callable[[str], str]) -> str:
+        key = (kind, os.path.abspath(path))
+        stat = os.stat(path)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+
+        content = read(path)
+        with self._lock:
+            self._entries[key] = (stat.st_mtime_ns, stat.st_size, content)
+        return content
+
+
+# shared by all exports of the process
+asset_cache = AssetCache()
+
+
+def _inline_tag(match: re.Match) -> str:
+    tag = match.group(0)
+    attributes = _attributes(tag)
+
+    # replace stylesheet links with a style element holding the css
+    if match.group(1).lower() == "link":
+        if attributes.get("rel", "").lower() != "stylesheet" or "href" not in attributes:
+            return tag
+        return f'<style type="text/css">{asset_cache.css(attributes["href"])}</style>'
+
+    # embed images as base64 data uri, already embedded images are left alone
+    src = attributes.get("src")
+    if not src or src.startswith("data:"):
+        return tag
+    value = re.search(r"""\bsrc\s*=\s*("[^"]*"|'[^']*'|[^\s>]+)""", tag, re.IGNORECASE)
+    return tag[:value.start(1)] + f'"{asset_cache.image_data_uri(src)}"' + tag[value.end(1):]
+
+
+def asset_references(source: str) -> List[str]:
+    """
+    Returns the paths of the stylesheets and images a template embeds, through <link rel="stylesheet"> and
+    <img> tags or the inline_css and inline_image globals. Paths built by template expressions are not found.
+
+    Args:
+        source (str): The html or template source.
+
+    Returns:
+        List[str]: The referenced paths in order of appearance, without duplicates.
+    """
+    paths = []
+    for match in TAG_PATTERN.finditer(source):
+        attributes = _attributes(match.group(0))
+        if match.group(1).lower() == "link":
+            if attributes.get("rel", "").lower() == "stylesheet" and "href" in attributes:
+                paths.append(attributes["href"])
+        elif attributes.get("src") and not attributes["src"].startswith("data:"):
+            paths.append(attributes["src"])
+    paths.extend(value.strip("\"'") for value in GLOBAL_CALL_PATTERN.findall(source))
+    return list(dict.fromkeys(paths))
+
+
+def inline_assets(html: str) -> str:
+    """
+    Embeds the stylesheets and images referenced by <link rel="stylesheet"> and <img> tags into the html,
+    using a targeted scanner instead of parsing the whole document.
+
+    Args:
+        html (str): The html source, or a fragment of it containing only complete tags.
+
+    Returns:
+        str: The html source with the referenced files embedded.
+    """
+    return TAG_PATTERN.sub(_inline_tag, html)
+
+
+def inline_assets_stream(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Embeds stylesheets and images into a stream of html chunks, see inline_assets.
+
+    A tag split over two chunks is held back until it is complete, so chunks can be cut anywhere.
+
+    Args:
+        chunks (Iterable[str]): The html source in chunks, e.g. from jinja2.Template.generate.
+
+    Returns:
+        Iterator[str]: The consolidated html source in chunks.
+    """
+    pending = ""
+    for chunk in chunks:
+        chunk = pending + chunk
+        # hold back an unfinished tag at the end of the chunk
+        last_open = chunk.rfind("<")
+        if last_open > chunk.rfind(">"):
+            chunk, pending = chunk[:last_open], chunk[last_open:]
+        else:
+            pending = ""
+        if chunk:
+            yield inline_assets(chunk)
+    if pending:
+        yield inline_assets(pending)
@@ -0,0 +1,96 @@
+import time, threading
+from typing import Optional
+
+from sub.DB_Table_Export.ColorMatcher import InstructorColorMatcher
+
+COLOR_SQL = "SELECT Familienname, Farbe from kat_ausbilder"
+
+
+class InstructorColorCache:
+    def __init__(self, ttl: float = 300.0, sql: str = COLOR_SQL, version_sql: str = None):
+        """
+        Caches the instructor colors and their compiled matcher, so batch exports do not query the database per report.
+
+        Args:
+            ttl (float, optional): Seconds the cached colors are used before they are checked again. Defaults to 300.
+            sql (str, optional): The query returning (name, color) rows. Defaults to COLOR_SQL.
+            version_sql (str, optional): A cheap query returning one row that changes whenever the colors change,
+                e.g. "SELECT COUNT(*), MAX(modified) FROM kat_ausbilder". When set, an expired cache is only
+                reloaded if the version changed. Defaults to None.
+        """
+        self.ttl = ttl
+        self.sql = sql
+        self.version_sql = version_sql
+
+        self._colors: Optional[dict] = None
+        self._matcher: Optional[InstructorColorMatcher] = None
+        self._version = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db) -> dict:
+        """
+        Returns the instructor colors, querying the database only if the cache is empty or outdated.
+
+        Args:
+            db: A database object with a select(sql) method returning a DB-API cursor.
+
+        Returns:
+            dict: A dictionary mapping instructor names to colors.
+        """
+        with self._lock:
+            self.__refresh(db)
+            return self._colors
+
+    def matcher(self, db) -> InstructorColorMatcher:
+        """
+        Returns the compiled matcher for the cached colors, it is only rebuilt when the colors change.
+
+        Args:
+            db: A database object with a select(sql) method returning a DB-API cursor.
+
+        Returns:
+            InstructorColorMatcher: The matcher for the current colors.
+        """
+        with self._lock:
+            self.__refresh(db)
+            if self._matcher is None:
+                self._matcher = InstructorColorMatcher(self._colors)
+            return self._matcher
+
+    def seed(self, color_dict: dict) -> None:
+        """ Fills the cache with already known colors, e.g. in worker processes of a batch export. """
+        with self._lock:
+            self.__store(dict(color_dict), None)
+
+    def invalidate(self) -> None:
+        """ Forces the next access to query the database. """
+        with self._lock:
+            self._expires = 0.0
+            self._version = None
+
+    def __refresh(self, db) -> None:
+        # must be called with the lock held
+        if self._colors is not None and time.monotonic() < self._expires:
+            return
+
+        version = None
+        if self.version_sql is not None:
+            version = tuple(db.select(self.version_sql).fetchone() or ())
+            if self._colors is not None and version == self._version:
+                self._expires = time.monotonic() + self.ttl
+                return
+
+        fetch = db.select(self.sql).fetchall()
+        self.__store(dict((key, value) for key, value in fetch), version)
+
+    def __store(self, colors: dict, version) -> None:
+        if colors != self._colors:
+            self._matcher = None
+        self._colors = colors
+        self._version = version
+        self._expires = time.monotonic() + self.ttl
+
+
+# shared by all reports of the process
+instructor_colors = InstructorColorCache()
@@ -0,0 +1,92 @@
+import re
+from typing import Dict, List
+
+# regex for 3 or 6 digit hex color
+HEX_COLOR_PATTERN = re.compile(r"(#[\da-fA-F]{3,6})")
+# characters a name has to be enclosed by to count as a match
+SEPARATORS = r"[\s/\\]"
+# the number of memoized cell texts after which the memo is reset
+MEMO_LIMIT = 100000
+
+
+class InstructorColorMatcher:
+    def __init__(self, color_dict: dict):
+        """
+        Precompiles a matcher resolving cell texts to background colors, built once per export.
+
+        All instructor names are combined into one regex, so each cell text is scanned once instead of once per name.
+        Results are memoized per text, so repeated cell values are only evaluated once.
+
+        Args:
+            color_dict (dict): A dictionary mapping instructor names to colors.
+        """
+        # the colors in the order of color_dict, a cell with several names lists its colors in this order
+        self._colors = list(color_dict.values())
+        # lowercased name -> indexes into self._colors
+        self._indexes: Dict[str, List[int]] = {}
+        for i, name in enumerate(color_dict.keys()):
+            if name:
+                self._indexes.setdefault(name.lower(), []).append(i)
+
+        names = sorted(self._indexes.keys(), key=len, reverse=True)
+        self._pattern = None
+        if names:
+            # zero width match at every position, capturing the longest name enclosed by separators
+            alternation = "|".join(re.escape(name) for name in names)
+            self._pattern = re.compile(fr"(?<={SEPARATORS})(?=({alternation}){SEPARATORS})")
+
+        # a name followed by a separator at the start of a longer name is hidden behind the longer one,
+        # those few names are checked separately
+        self._shadowed = []
+        for name in names:
+            if any(other != name and other.startswith(name) and re.match(SEPARATORS, other[len(name)])
+                   for other in names):
+                self._shadowed.append((name, re.compile(fr"{SEPARATORS}{re.escape(name)}{SEPARATORS}")))
+
+        self._memo: Dict[str, str] = {}
+
+    def cell_style(self, text: str) -> str:
+        """
+        Returns the background style of a cell.
+
+        Hex colors in the text take precedence over instructor names. Several colors result in a gradient.
+
+        Args:
+            text (str): The text of the cell.
+
+        Returns:
+            str: The css background declaration of the cell.
+        """
+        style = self._memo.get(text)
+        if style is None:
+            if len(self._memo) >= MEMO_LIMIT:
+                self._memo.clear()
+            style = self._memo[text] = self.__evaluate(text)
+        return style
+
+    def __evaluate(self, text: str) -> str:
+        text = text.lower()
+        # search for hex values in text
+        cell_colors = HEX_COLOR_PATTERN.findall(text)
+
+        # if no hex values found search for instructor names
+        if not cell_colors:
+            cell_colors = [self._colors[i] for i in self.__matching_indexes(text.replace("\n", " "))]
+
+        # evaluate formatted background color
+        if len(cell_colors) < 1:
+            return "background-color: #FFFFFF;"
+        elif len(cell_colors) < 2:
+            return f"background-color: {cell_colors[0]};"
+        return f"background-image: linear-gradient(to bottom right, {','.join(cell_colors)});"
+
+    def __matching_indexes(self, text: str) -> List[int]:
+        if self._pattern is None:
+            return []
+
+        found = {match.group(1) for match in self._pattern.finditer(text)}
+        for name, pattern in self._shadowed:
+            if name not in found and pattern.search(text):
+                found.add(name)
+
+        return sorted(i for name in found for i in self._indexes[name])
@@ -1,20 +1,95 @@
-import base64, os, jinja2, datetime, bs4, sys
-from typing import Union, Collection
-
-import chromedriver_autoinstaller_fix
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium import webdriver
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from subprocess import CREATE_NO_WINDOW
-import definitions
+import os, jinja2, datetime, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Collection, Dict, Iterable, List, NamedTuple, Optional, Sequence, TextIO
+
+from sub.DB_Table_Export.AssetInliner import asset_cache, inline_assets, inline_assets_stream
+from sub.DB_Table_Export.DriverPool import ChromeDriverPool, resource_path
+from sub.DB_Table_Export.Instrumentation import ExportStats
+from sub.DB_Table_Export.LayoutEstimator import LayoutEstimator
+from sub.DB_Table_Export.OutputWriter import output_writer
+from sub.DB_Table_Export.PdfBackends import PdfBackend, ChromePdfBackend, NativePdfBackend, calculate_page_setup
+from sub.DB_Table_Export.ReportCache import ReportCache, report_key
+from sub.DB_Table_Export.StyleInterning import apply_column_styles, intern_cell_styles
+from sub.DB_Table_Export.ShapeValidation import ShapeMismatchError, ShapeValidator, check_same_shape, is_nested
+from sub.DB_Table_Export.TempWorkspace import TempWorkspace
+from sub.DB_Table_Export.TemplateEnvironment import TemplateEnvironment, get_environment
+
+
+class ExportJob(NamedTuple):
+    """ One report of a batch export, see DatabaseExport.export_many. """
+    template: str
+    export_name: str
+    display_headers: Collection
+    rows: Collection
+    rows_addition_data: Collection = None
+    output_dir: str = ""
+    html: bool = True
+    pdf: bool = True
+    is_landscape: bool = None
+    scale: float = None
+    paper_format: str = "a4"
+
+
+class ExportResult(NamedTuple):
+    """ The outcome of one ExportJob. Paths are None for formats that were not requested or failed. """
+    job: ExportJob
+    html_path: Optional[str]
+    pdf_path: Optional[str]
+    timings: Dict[str, float]
+    error: Optional[BaseException]
+
+
+# driver pool of a worker process, only used when exporting with processes
+_process_driver_pool: Optional[ChromeDriverPool] = None
+
+
+def _init_export_process():
+    global _process_driver_pool
+    from multiprocessing.util import Finalize
+
+    _process_driver_pool = ChromeDriverPool(size=1)
+    # pool workers leave with os._exit, which skips atexit, the finalizers of multiprocessing still run
+    Finalize(None, _process_driver_pool.close, exitpriority=10)
+
+
+def _run_export_job(job: ExportJob, pool: ChromeDriverPool = None) -> ExportResult:
+    timings = {}
+    html_path, pdf_path = None, None
+    start = time.perf_counter()
+    try:
+        dbExp = DatabaseExport(job.template, job.export_name, job.output_dir, job.output_dir)
+        try:
+            html_path = dbExp.create_html(job.display_headers, job.rows, job.rows_addition_data,
+                                          open_file=False, save_file=job.html)
+            timings["html"] = time.perf_counter() - start
+            if not job.html:
+                html_path = None
+
+            if job.pdf:
+                pdf_start = time.perf_counter()
+                pdf_path = dbExp.convert_html_to_pdf(is_landscape=job.is_landscape, paper_format=job.paper_format,
+                                                     scale=job.scale, open_file=False, save_file=True,
+                                                     pool=pool or _process_driver_pool)
+                timings["pdf"] = time.perf_counter() - pdf_start
+                if pdf_path is None:
+                    raise TimeoutError("Loading the HTML page took too much time")
+        finally:
+            dbExp.workspace.cleanup()
+            # wall time per stage, next to the html, pdf and total times
+            timings.update(dbExp.stats.totals())
+
+        error = None
+    except Exception as e:
+        error = e
+
+    timings["total"] = time.perf_counter() - start
+    return ExportResult(job, html_path, pdf_path, timings, error)
 
 
 class DatabaseExport:
-    def __init__(self, template: str, export_name: str, path_to_output_html, path_to_output_pdf):
+    def __init__(self, template: str, export_name: str, path_to_output_html, path_to_output_pdf,
+                 keep_tmp_files=False, template_env: TemplateEnvironment = None, report_cache: ReportCache = None,
+                 stats: ExportStats = None):
         """
         Initializes a DatabaseExport object with the given parameters.
 
@@ -23,12 +98,33 @@ class DatabaseExport:
             export_name (str): The name of the export, which can contain a <split> token to separate the title and the extra title.
             path_to_output_html (str): The path to save the output HTML file.
             path_to_output_pdf (str): The path to save the output PDF file.
-
+            keep_tmp_files (bool, optional): Whether to keep the intermediate files after the export for debugging.
+                Defaults to False.
+            template_env (TemplateEnvironment, optional): The environment to load the template from.
+                When None, the shared environment for the current directory is used. Defaults to None.
+            report_cache (ReportCache, optional): A cache of generated documents, consulted by create_html and
+                convert_html_to_pdf so unchanged reports are not rendered and printed again. Defaults to None.
+            stats (ExportStats, optional): Records the time spent in each stage of the export, see the stats
+                attribute. When None, a new ExportStats is created. Defaults to None.
 
         """
 
         # Filenames
         self.template = template
+        self.template_env = template_env
+        self.html_source = None
+        self.report_cache = report_cache
+        # content address of html_source in the report cache
+        self.html_key = None
+        # orientation and scale the last PDF was printed with, set by the PDF backends
+        self.page_setup = None
+
+        # Report data of the last create_html call, used by PDF backends printing without HTML
+        self.display_headers = None
+        self.rows = None
+        self.rows_addition_data = None
+        self.intern_styles = False
+        self.column_styles = None
         splitup = export_name.split("<split>")
         self.title = splitup[0]
         self.extratitle = ""
@@ -42,6 +138,9 @@ class DatabaseExport:
         for c in bad_chars:
             self.escaped_export_name = self.escaped_export_name.replace(c, "_")
 
+        # time and memory spent in each stage of the export
+        self.stats = stats if stats is not None else ExportStats(self.escaped_export_name)
+
         if path_to_output_html == "":
             self.output_html = os.path.abspath(f"{export_name}_Export_{datetime.date.today()}.html")
         else:
@@ -59,106 +158,232 @@ class DatabaseExport:
                             "A4": (8.3, 11.7), "a4": (8.3, 11.7),
                             "A3": (11.7, 16.5), "a3": (11.7, 16.5)}
 
-        self.tmp_html_path = "tmp_files\\tmp_report.html"
-        self.tmp_pdf_path = "tmp_files\\tmp_report.pdf"
+        # private temporary directory, so concurrent exports never share intermediate files
+        self.workspace = TempWorkspace(keep=keep_tmp_files)
+        self.tmp_html_path = self.workspace.file("tmp_report.html")
+        self.tmp_pdf_path = self.workspace.file("tmp_report.pdf")
+
+    @staticmethod
+    def get_template(template_name, template_env: TemplateEnvironment = None) -> jinja2.Template:
+        # compiled templates are cached by the environment and only recompiled when the file changed
+        if template_env is None:
+            template_env = get_environment("./")
+        return template_env.get_template(template_name)
 
     @staticmethod
-    def render_without_request(template_name, **template_vars):
+    def render_without_request(template_name, template_env: TemplateEnvironment = None, **template_vars):
         # Usage is the same as flask.render_template:
-        env = jinja2.Environment(
-            loader=jinja2.FileSystemLoader("./")
-        )
-        template = env.get_template(template_name)
+        template = DatabaseExport.get_template(template_name, template_env)
         return template.render(**template_vars)
 
     def get_format_in_inches(self, paper_format: str):
         return self.format_dict[paper_format]
 
     @staticmethod
-    def consolidate_css_html(input_html) -> str:
+    def consolidate_css_html(input_html, use_parser=False) -> str:
         """
         Consolidate the html string with its external css references and png images,
         so any externally referenced css page(s) and image file(s) are not needed.
 
+        By default only the <link> and <img> tags are scanned for, without building a DOM over the whole document.
+        The file contents are cached by path and modification time across exports.
+
         :param input_html: A string containing the content of the html file
+        :param use_parser: Whether to parse the whole document with BeautifulSoup instead, which also normalizes the markup
         :return: A string containing the html source now with the before external css and images embedded into it
         """
+        if not use_parser:
+            return inline_assets(input_html)
+
+        # bs4 and lxml are only needed for the parser, the default path does not load them
+        import bs4
+
         soup = bs4.BeautifulSoup(input_html, features="lxml")
         stylesheets = soup.findAll("link", {"rel": "stylesheet"})
         for s in stylesheets:
             t = soup.new_tag('style')
-            c = bs4.element.NavigableString(open(s["href"]).read())
+            c = bs4.element.NavigableString(asset_cache.css(s["href"]))
             t.insert(0, c)
             t['type'] = 'text/css'
             s.replaceWith(t)
 
         images = soup.findAll("img")
         for i in images:
-            f = open(i["src"], "rb")
-            b = base64.b64encode(f.read())
-            f.close()
-            i["src"] = "data:image/png;base64," + b.decode()
+            if not i["src"].startswith("data:"):
+                i["src"] = asset_cache.image_data_uri(i["src"])
 
         return str(soup)
 
     def create_html(self, display_headers: Collection, rows: Collection, rows_addition_data: Collection = None,
-                    open_file=True, save_file=False) -> str:
+                    open_file=True, save_file=False, write_tmp_file=True, intern_styles=False,
+                    column_styles: Dict[int, str] = None) -> str:
         """
         Creates an HTML file from the given data and template, and optionally opens and saves it.
 
+        The consolidated HTML source is kept in the html_source attribute, so it can be converted
+        in memory with convert_html_to_pdf_bytes.
+
+        The shapes of rows and rows_addition_data are checked up front, arrays with a shape attribute by their shapes.
+        Rows that are not a sequence, e.g. a database cursor, are read into a list first,
+        use stream_html to render them without holding all rows in memory.
+
         Args:
             display_headers (Collection): A collection of strings to use as the headers of the HTML table.
             rows (Collection): A collection of collections of strings to use as the data of the HTML table.
             rows_addition_data (Collection): A collection of collections of strings to use as the additional data of the HTML table, for now only for custom cell background colors
             open_file (bool, optional): Whether to open the HTML file after creating it. Defaults to True.
             save_file (bool, optional): Whether to save the HTML file to the output path. Defaults to False.
+            write_tmp_file (bool, optional): Whether to write the temporary HTML file needed by convert_html_to_pdf.
+                It is always written when open_file is set. Defaults to True.
+            intern_styles (bool, optional): Whether to pass each distinct cell style once as css class instead of
+                an inline style per cell. The template then gets intern_styles=True, the css rules as cell_styles
+                for a <style> block and the class names as rows_addition_data, empty for white cells. Defaults to False.
+            column_styles (Dict[int, str], optional): Styles of whole columns by zero based index, e.g. holidays.
+                With intern_styles they are one css rule per column, else they are set on every cell of the
+                column in rows_addition_data. Defaults to None.
 
         Returns:
             str: The absolute path to the output HTML file.
 
         Raises:
-            TypeError:
-                If the rows and rows_addition_data collections have different shapes.
+            ShapeMismatchError:
+                If the rows and rows_addition_data collections have different shapes, a TypeError
+                carrying the index of the first mismatch.
         """
 
         print(f"{datetime.datetime.now()}: creating {self.escaped_export_name} HTML file...")
-        # checking shape
-        print("checking shape")
-        if rows_addition_data and not self.__check_same_shape__(rows, rows_addition_data, 1):
-            raise TypeError("The collections have different shapes")
-
-        # generate source html string from template and data
-        sourceHtml = DatabaseExport.render_without_request(
-            self.template, title=self.title, extratitle=self.extratitle, header=display_headers,
-            rows=rows, rows_addition_data=rows_addition_data, zip=zip
-        )
-
-        # consolidate the html string with its external css references,
-        # so any externally referenced css page(s) are not needed.
-        sourceHtml = self.consolidate_css_html(sourceHtml)
+        # the rows are rendered, hashed and measured, so lazy rows are read once here
+        if not is_nested(rows):
+            rows = list(rows)
+        if rows_addition_data is not None and not is_nested(rows_addition_data):
+            rows_addition_data = list(rows_addition_data)
+
+        # checking shape, the template can then pair rows and cells with the plain zip
+        if rows_addition_data is not None:
+            print("checking shape")
+            with self.stats.stage("shape_check"):
+                check_same_shape(rows, rows_addition_data, 1)
+
+        if column_styles and not intern_styles:
+            # inline styles only, so the columns are marked cell by cell
+            rows_addition_data = apply_column_styles(rows_addition_data, column_styles, len(rows), len(display_headers))
+
+        self.display_headers, self.rows, self.rows_addition_data = display_headers, rows, rows_addition_data
+        self.intern_styles, self.column_styles = intern_styles, column_styles
+
+        sourceHtml = None
+        if self.report_cache is not None:
+            # address the document by the template source, the files it embeds and everything rendered into it
+            template_env = self.template_env if self.template_env is not None else get_environment("./")
+            self.html_key = report_key(template_env.checksum(self.template), template_env.asset_stamps(self.template),
+                                       self.title, self.extratitle,
+                                       list(display_headers), rows_addition_data is None, intern_styles,
+                                       sorted(column_styles.items()) if column_styles else None,
+                                       rows=rows if rows_addition_data is None else zip(rows, rows_addition_data))
+            cached = self.report_cache.get(self.html_key, "html")
+            if cached is not None:
+                print(f"{datetime.datetime.now()}: using cached HTML")
+                sourceHtml = cached.decode("utf-8")
+
+        if sourceHtml is None:
+            # generate source html string from template and data
+            style_vars = self.__style_vars(rows_addition_data, intern_styles, column_styles)
+            with self.stats.stage("jinja_render"):
+                sourceHtml = DatabaseExport.render_without_request(
+                    self.template, self.template_env, title=self.title, extratitle=self.extratitle,
+                    header=display_headers, rows=rows, zip=zip, **style_vars
+                )
+
+            # consolidate the html string with its external css references,
+            # so any externally referenced css page(s) are not needed.
+            with self.stats.stage("consolidation"):
+                sourceHtml = self.consolidate_css_html(sourceHtml)
+            if self.report_cache is not None:
+                self.report_cache.put(self.html_key, "html", sourceHtml.encode("utf-8"))
+        self.html_source = sourceHtml
 
         # save as temporary file
-        print(f"{datetime.datetime.now()}: saving temporary HTML file")
-        self.__save_to_file(self.tmp_html_path, sourceHtml, override_check=False)
+        if write_tmp_file or open_file:
+            print(f"{datetime.datetime.now()}: saving temporary HTML file")
+            with self.stats.stage("temp_write"):
+                self.__save_to_file(self.tmp_html_path, sourceHtml, override_check=False)
 
         # open file
         if open_file:
             print(f"{datetime.datetime.now()}: opening HTML file")
+            # the viewer reads the file asynchronously, keep it until exit
+            self.workspace.defer_cleanup()
             os.startfile(self.tmp_html_path)
 
         # save to file
         if save_file:
             print(f"{datetime.datetime.now()}: saving HTML file")
-            self.output_html = self.__save_to_file(self.output_html, sourceHtml, override_check=True)
+            with self.stats.stage("final_save"):
+                self.output_html = self.__save_to_file(self.output_html, sourceHtml, override_check=True)
             print(f"{datetime.datetime.now()}: saved HTML file to {self.output_html}")
 
         # return path
         return self.output_html
 
+    def __style_vars(self, rows_addition_data: Collection, intern_styles: bool,
+                     column_styles: Dict[int, str] = None) -> dict:
+        # the cell styles as the template expects them, inline or as generated classes
+        if not intern_styles or (rows_addition_data is None and not column_styles):
+            return {"rows_addition_data": rows_addition_data, "intern_styles": False, "cell_styles": ""}
+
+        with self.stats.stage("style_interning"):
+            interned = intern_cell_styles(rows_addition_data if rows_addition_data is not None else [], column_styles)
+        return {"rows_addition_data": interned.classes, "intern_styles": True, "cell_styles": interned.css}
+
+    def stream_html(self, display_headers: Collection, rows: Iterable, rows_addition_data: Iterable = None,
+                    output: Union[str, TextIO] = None, buffer_size: int = 64) -> Union[str, None]:
+        """
+        Renders the template chunk by chunk and writes the chunks straight to a file or stream,
+        so the whole document is never held in memory.
+
+        The rows may be a lazy iterator such as a database cursor. Their shape is checked while they are rendered,
+        the template has to use the passed zip to pair rows with rows_addition_data for this.
+        Stylesheets and images are embedded on the fly.
+
+        Args:
+            display_headers (Collection): A collection of strings to use as the headers of the HTML table.
+            rows (Iterable): An iterable of collections of strings to use as the data of the HTML table.
+            rows_addition_data (Iterable, optional): An iterable of collections of strings to use as the additional data of the HTML table. Defaults to None.
+            output (Union[str, TextIO], optional): A path or a writable text stream, e.g. socket.makefile("w").
+                When None, the temporary HTML file is written, so convert_html_to_pdf can be used afterwards. Defaults to None.
+            buffer_size (int, optional): The number of template chunks joined before each write. Defaults to 64.
+
+        Returns:
+            Union[str, None]: The absolute path of the written file, or None if a stream was given.
+
+        Raises:
+            ShapeMismatchError:
+                If the rows and rows_addition_data have different shapes.
+        """
+        print(f"{datetime.datetime.now()}: streaming {self.escaped_export_name} HTML...")
+        template = DatabaseExport.get_template(self.template, self.template_env)
+        stream = template.stream(title=self.title, extratitle=self.extratitle, header=display_headers,
+                                 rows=rows, rows_addition_data=rows_addition_data, zip=ShapeValidator(rows).zip)
+        stream.enable_buffering(buffer_size)
+
+        if output is None:
+            output = self.tmp_html_path
+
+        if isinstance(output, str):
+            with open(output, "w", encoding="utf-8") as f:
+                f.writelines(inline_assets_stream(stream))
+            print(f"{datetime.datetime.now()}: streamed HTML to {output}")
+            return os.path.abspath(output)
+
+        output.writelines(inline_assets_stream(stream))
+        return None
+
     def convert_html_to_pdf(self, is_landscape=None, print_background=True, paper_format="a4",
-                            scale=None, open_file=True, save_file=False) -> Union[str, None]:
+                            scale=None, open_file=True, save_file=False,
+                            pool: ChromeDriverPool = None, backend: PdfBackend = None) -> Union[str, None]:
         """
-        Converts the HTML file to a PDF file using a headless Chrome browser, and optionally opens and saves it.
+        Converts the HTML file to a PDF file using a headless Chrome browser or another PDF backend,
+        and optionally opens and saves it.
 
         Note: This method assumes that the create_html method has been called before to create the HTML file.
 
@@ -169,6 +394,10 @@ class DatabaseExport:
             scale (float, optional): The scale factor to use for the PDF file. Must be between 0.1 and 2. When None, get's calculated. Defaults to None.
             open_file (bool, optional): Whether to open the PDF file after creating it. Defaults to True.
             save_file (bool, optional): Whether to save the PDF file to the output path. Defaults to False.
+            pool (ChromeDriverPool, optional): A pool to take a warm driver from. When None, a new driver
+                is started and quit for this conversion. Defaults to None.
+            backend (PdfBackend, optional): The engine to create the PDF with, e.g. NativePdfBackend for plain
+                tables without a browser. When None, a ChromePdfBackend with the given pool is used. Defaults to None.
 
         Returns:
             Union[str, None]: The absolute path to the output PDF file, or None if the conversion failed.
@@ -176,134 +405,248 @@ class DatabaseExport:
         """
         print(f"{datetime.datetime.now()}: converting HTML to PDF...")
 
-        # define chromedriver options
-        options = Options()
-        options.add_argument("--headless=new")
-        options.add_argument("--window-size=1920,1080")
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument("--log-level=3")
-
-        # get the accurate chromedriver path (needed to do like this for the compiled exe version)
-        chromedriver_path = self.__resource_path__('./tmp_files/drivers/')
+        if backend is None:
+            backend = ChromePdfBackend(pool)
+        pdf = self.__render_pdf(backend, is_landscape, print_background, paper_format, scale)
 
-        # install or update the chromedriver if needed
-        chromedriver_autoinstaller_fix.install(cwd=False, path=chromedriver_path)
-        # Check if the current version of chromedriver exists
-        # and if it doesn't, download it automatically,
-        # then add chromedriver to path
-
-        # create the chrome_service from path and set flags appropriately
-        chrome_service = Service(log_path=os.devnull)
-        chrome_service.creation_flags = CREATE_NO_WINDOW
-
-        # finally create our driver object
-        driver = webdriver.Chrome(service=chrome_service, options=options)
-        print("    chromedriver in PATH found")
-
-        # set current site to the generated html file
-        driver.get(os.path.abspath(self.tmp_html_path))
-
-        # wait for it to load
-        try:
-            myElem = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, 'loaded')))
-            print("    HTML page successfully loaded")
-        except TimeoutException:
-            print("    Loading took too much time")
-            print("    Aborting...")
+        if pdf is None:
             return None
 
-        # calculate params if None is passed
-        if is_landscape is None or scale is None:
-            # get the size of the table element
-            content = driver.find_element(By.CLASS_NAME, "content")
-            content_size = content.size
-            # get width and height and add margin
-            content_width = content_size["width"] + (15 * 2)
-            content_height = content_size["height"] + (15 * 2)
-
-            if is_landscape is None:
-                if content_width > content_height:
-                    is_landscape = True
-                else:
-                    is_landscape = False
-
-            # add "cutoff safety" spacing of 10% the width
-            content_width += (content_width * 0.10)
-
-            # get the paper format width or height depending on the orientation, in pixels
-            # assuming 96 DPI and paper size in inches
-            paper_width = self.format_dict[paper_format][1 if is_landscape else 0] * 96
-
-            # calculate the scale factor based on the ratio of table size and paper size
-            # assuming landscape orientation and some margin
-            calculated_scale = (paper_width - 20) / content_width
-
-            # clamp the scale factor between 0.1 and 2.0
-            calculated_scale = max(0.1, min(2.0, calculated_scale))
-
-            if scale is None:
-                scale = calculated_scale
-
-        # set parameters for pdf conversion
-        params = {'landscape': is_landscape, 'printBackground': print_background, 'scale': scale,
-                  'paperWidth': self.format_dict[paper_format][0], 'paperHeight': self.format_dict[paper_format][1]}
-
-        # perform pdf conversion
-        pdf = driver.execute_cdp_cmd("Page.printToPDF", params)
-        driver.quit()
-
         # save as temporary file
         print(f"{datetime.datetime.now()}: saving temporary PDF file")
-        self.__save_to_file(self.tmp_pdf_path, base64.b64decode(pdf['data']), override_check=False)
+        with self.stats.stage("temp_write"):
+            self.__save_to_file(self.tmp_pdf_path, pdf, override_check=False)
+
+        return self.__open_and_save_pdf(pdf, open_file, save_file)
 
+    def __open_and_save_pdf(self, pdf: bytes, open_file: bool, save_file: bool) -> str:
         # open file
         if open_file:
             print(f"{datetime.datetime.now()}: opening PDF file")
+            # the viewer reads the file asynchronously, keep it until exit
+            self.workspace.defer_cleanup()
             os.startfile(self.tmp_pdf_path)
 
         # save file
         if save_file:
             print(f"{datetime.datetime.now()}: saving PDF file")
-            self.output_pdf = self.__save_to_file(self.output_pdf, base64.b64decode(pdf['data']),
-                                                  override_check=True)
+            with self.stats.stage("final_save"):
+                self.output_pdf = self.__save_to_file(self.output_pdf, pdf, override_check=True)
             print(f"{datetime.datetime.now()}: saved PDF file to {self.output_pdf}")
 
         # return path
         return self.output_pdf
 
-    @staticmethod
-    def __save_to_file(output_path: str, data: Union[str, bytes], override_check=False) -> str:
-        if override_check and os.path.exists(output_path):
-            # Split the output path into the part before and after the dot
-            no_suffix_path, suffix = output_path.split('.')
+    def convert_html_to_pdf_bytes(self, html: str = None, is_landscape=None, print_background=True,
+                                  paper_format="a4", scale=None, pool: ChromeDriverPool = None,
+                                  backend: PdfBackend = None) -> Union[bytes, None]:
+        """
+        Converts an HTML string to PDF bytes using a headless Chrome browser, without touching the disk.
 
-            # Initialize a counter for duplicate file names
-            i = 1
+        The HTML is handed to Chrome with Page.setDocumentContent, so no temporary files are written or read.
+        Create the HTML with create_html(..., open_file=False, write_tmp_file=False) to skip the disk entirely.
 
-            # Loop until there is no existing file with the same name
-            while os.path.exists(f"{no_suffix_path} ({i}).{suffix}"):
-                i += 1
+        Args:
+            html (str, optional): The consolidated HTML source. When None, the html_source attribute
+                set by create_html is used. Defaults to None.
+            is_landscape (bool, optional): Whether to use landscape orientation for the PDF file. When None, get's calculated. Defaults to None.
+            print_background (bool, optional): Whether to print the background graphics of the HTML file. Defaults to True.
+            paper_format (str, optional): The paper format to use for the PDF file. Must be one of the keys in the format_dict attribute. Defaults to "a4".
+            scale (float, optional): The scale factor to use for the PDF file. Must be between 0.1 and 2. When None, get's calculated. Defaults to None.
+            pool (ChromeDriverPool, optional): A pool to take a warm driver from. Defaults to None.
+            backend (PdfBackend, optional): The engine to create the PDF with. When None, a ChromePdfBackend
+                with the given pool is used. Defaults to None.
+
+        Returns:
+            Union[bytes, None]: The PDF document, or None if the conversion failed.
+        """
+        if html is None:
+            html = self.html_source
+
+        print(f"{datetime.datetime.now()}: converting HTML to PDF in memory...")
+        if backend is None:
+            backend = ChromePdfBackend(pool)
+        return self.__render_pdf(backend, is_landscape, print_background, paper_format, scale, html=html)
+
+    def convert_html_to_pdf_chunked(self, chunk_rows: int = 200, workers: int = 1, is_landscape=None,
+                                    print_background=True, paper_format="a4", scale=None, open_file=True,
+                                    save_file=False, pool: ChromeDriverPool = None, backend: PdfBackend = None,
+                                    layout_estimator: LayoutEstimator = None) -> Union[str, None]:
+        """
+        Converts the report to a PDF file slice by slice, so the browser never holds more than chunk_rows rows
+        of a huge table, and optionally opens and saves it.
+
+        Every slice is rendered as its own document with the table headers and printed in memory.
+        The printed slices are written to the temporary directory and merged into one PDF file with pypdf.
+        Orientation and scale are calculated once, so all pages look the same. They are predicted for the whole
+        table if a layout_estimator is given, else the browser measures the first slice and the others reuse its setup.
+
+        Note: This method assumes that the create_html method has been called before, it reuses its data.
+
+        Args:
+            chunk_rows (int, optional): The number of rows per slice. Defaults to 200.
+            workers (int, optional): The number of slices printed at the same time. Defaults to 1.
+            is_landscape (bool, optional): Whether to use landscape orientation for the PDF file. When None, get's calculated. Defaults to None.
+            print_background (bool, optional): Whether to print the background graphics of the HTML file. Defaults to True.
+            paper_format (str, optional): The paper format to use for the PDF file. Must be one of the keys in the format_dict attribute. Defaults to "a4".
+            scale (float, optional): The scale factor to use for the PDF file. Must be between 0.1 and 2. When None, get's calculated. Defaults to None.
+            open_file (bool, optional): Whether to open the PDF file after creating it. Defaults to True.
+            save_file (bool, optional): Whether to save the PDF file to the output path. Defaults to False.
+            pool (ChromeDriverPool, optional): A pool to take warm drivers from, it should hold one driver per worker.
+                When None, a new driver is started and quit for every slice. Defaults to None.
+            backend (PdfBackend, optional): The engine to print the slices with, it has to print the passed HTML.
+                When None, a ChromePdfBackend with the given pool is used. Defaults to None.
+            layout_estimator (LayoutEstimator, optional): Predicts the size of the whole table to calculate
+                orientation and scale, see ChromePdfBackend. Defaults to None.
+
+        Returns:
+            Union[str, None]: The absolute path to the output PDF file, or None if the conversion of a slice failed.
+
+        Raises:
+            ValueError:
+                If create_html was not called before, or if backend is a NativePdfBackend, which ignores
+                the HTML of the slices and writes the whole table, use it with convert_html_to_pdf instead.
+        """
+        # optional dependency, only needed to merge the slices
+        from pypdf import PdfWriter
+
+        if self.rows is None:
+            raise ValueError("create_html has to be called before the conversion")
+        if isinstance(backend, NativePdfBackend):
+            raise ValueError("NativePdfBackend can not print slices, use convert_html_to_pdf")
+
+        rows = self.rows if isinstance(self.rows, Sequence) else list(self.rows)
+        colors = self.rows_addition_data
+        if colors is not None and not isinstance(colors, Sequence):
+            colors = list(colors)
+        chunk_starts = range(0, max(len(rows), 1), chunk_rows)
+        print(f"{datetime.datetime.now()}: converting HTML to PDF in {len(chunk_starts)} slices...")
+
+        # one orientation and scale for all slices
+        if (is_landscape is None or scale is None) and layout_estimator is not None:
+            with self.stats.stage("layout_measurement"):
+                content_width, content_height = layout_estimator.estimate(self.template, self.display_headers, rows)
+            is_landscape, scale = calculate_page_setup(content_width, content_height, self.format_dict[paper_format],
+                                                       is_landscape, scale)
+
+        if backend is None:
+            backend = ChromePdfBackend(pool)
+
+        def print_chunk(index: int) -> Union[str, None]:
+            start = chunk_starts[index]
+            chunk_colors = colors[start:start + chunk_rows] if colors is not None else None
+            # only the first slice carries the title
+            style_vars = self.__style_vars(chunk_colors, self.intern_styles, self.column_styles)
+            with self.stats.stage("jinja_render"):
+                html = DatabaseExport.render_without_request(
+                    self.template, self.template_env, title=self.title if index == 0 else "",
+                    extratitle=self.extratitle if index == 0 else "", header=self.display_headers,
+                    rows=rows[start:start + chunk_rows], zip=zip, **style_vars
+                )
+            with self.stats.stage("consolidation"):
+                html = self.consolidate_css_html(html)
+            pdf = backend.render(self, is_landscape, print_background, paper_format, scale, html=html)
+            if pdf is None:
+                return None
+
+            chunk_path = self.workspace.file(f"tmp_report_{index}.pdf")
+            with open(chunk_path, "wb") as f:
+                f.write(pdf)
+            return chunk_path
+
+        # the first slice is printed alone, the backend measures it if orientation or scale are still open
+        chunk_paths = [print_chunk(0)]
+        if chunk_paths[0] is None:
+            return None
+        is_landscape, scale = self.page_setup
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            chunk_paths += executor.map(print_chunk, range(1, len(chunk_starts)))
+
+        if None in chunk_paths:
+            return None
+
+        # merge the slices into the temporary file, pages are copied from the files one slice at a time
+        print(f"{datetime.datetime.now()}: merging PDF slices")
+        with self.stats.stage("pdf_merge"):
+            writer = PdfWriter()
+            for chunk_path in chunk_paths:
+                writer.append(chunk_path)
+            with open(self.tmp_pdf_path, "wb") as f:
+                writer.write(f)
+            writer.close()
+
+        for chunk_path in chunk_paths:
+            os.remove(chunk_path)
 
-            # If the counter is greater than zero, append it to the output path
-            if i > 0:
-                output_path = f"{no_suffix_path} ({i}).{suffix}"
+        pdf = None
+        if save_file:
+            with open(self.tmp_pdf_path, "rb") as f:
+                pdf = f.read()
+        return self.__open_and_save_pdf(pdf, open_file, save_file)
+
+    def __render_pdf(self, backend: PdfBackend, is_landscape, print_background, paper_format, scale,
+                     html: str = None) -> Union[bytes, None]:
+        # only documents of html_source have a content address, other HTML is always printed
+        key = None
+        if self.report_cache is not None and self.html_key is not None and (html is None or html is self.html_source):
+            key = report_key(self.html_key, backend.cache_key(), is_landscape, print_background, paper_format,
+                             scale)
+            pdf = self.report_cache.get(key, "pdf")
+            if pdf is not None:
+                print(f"{datetime.datetime.now()}: using cached PDF")
+                return pdf
+
+        pdf = backend.render(self, is_landscape, print_background, paper_format, scale, html=html)
+        if pdf is not None and key is not None:
+            self.report_cache.put(key, "pdf", pdf)
+        return pdf
+
+    @staticmethod
+    def export_many(jobs: Iterable[ExportJob], workers: int = 4, use_processes=False,
+                    pool: ChromeDriverPool = None) -> List[ExportResult]:
+        """
+        Renders and prints many reports concurrently.
+
+        With threads all workers share one pool of warm Chrome drivers, with processes every
+        worker process keeps its own driver. A failing job does not abort the others,
+        its exception is returned in the error field of its result.
 
-        # Set the mode and encoding for writing to the file
-        mode = 'w'
-        encoding = 'utf-8'
-        # If the data is bytes, use binary mode and no encoding
-        if type(data) == bytes:
-            mode = 'w+b'
-            encoding = None
+        Args:
+            jobs (Iterable[ExportJob]): The reports to export.
+            workers (int, optional): The number of jobs running at the same time. Defaults to 4.
+            use_processes (bool, optional): Whether to use a process pool instead of a thread pool.
+                The jobs must be picklable then. Defaults to False.
+            pool (ChromeDriverPool, optional): The driver pool to use with threads. When None, a pool with one
+                driver per worker is created and closed afterwards. Ignored with processes. Defaults to None.
 
-        # Open the file with the given mode and encoding
-        with open(output_path, mode, encoding=encoding) as f:
-            # Write the data to the file
-            f.write(data)
+        Returns:
+            List[ExportResult]: One result per job, in the order of the jobs.
+        """
+        jobs = list(jobs)
+        print(f"{datetime.datetime.now()}: exporting {len(jobs)} reports with {workers} workers...")
+
+        if use_processes:
+            # multiprocessing is only loaded when processes are used
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_export_process) as executor:
+                return list(executor.map(_run_export_job, jobs))
+
+        own_pool = pool is None
+        if own_pool:
+            pool = ChromeDriverPool(size=workers)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(lambda job: _run_export_job(job, pool), jobs))
+        finally:
+            if own_pool:
+                pool.close()
 
-        # Return the output path as a string
-        return output_path
+    @staticmethod
+    def __save_to_file(output_path: str, data: Union[str, bytes], override_check=False) -> str:
+        # written atomically, with override_check an existing file is kept and the next free
+        # numbered name like "{name} (2).{suffix}" is reserved instead
+        return output_writer.write(output_path, data, unique=override_check)
 
     @staticmethod
     def __check_same_shape__(collection1: Collection, collection2: Collection, depth: int = None) -> bool:
@@ -311,10 +654,11 @@ class DatabaseExport:
 
         The shape of a collection is defined by its length and
         the length of its nested collections (if any).
+        Wraps ShapeValidation.check_same_shape, use it directly to get the index of the first mismatch.
 
         Args:
-            collection1: A list or tuple.
-            collection2: A list or tuple.
+            collection1: A sequence or array-like.
+            collection2: A sequence or array-like.
             depth: An optional integer indicating the maximum depth to check.
                    If None, the function checks the shape of the entire collections.
 
@@ -323,7 +667,7 @@ class DatabaseExport:
             False otherwise.
 
         Raises:
-            ValueError: If either collection is not a list or tuple,
+            ValueError: If either collection is not a sequence or array-like,
                         or if depth is not a positive integer or None.
 
         Examples:
@@ -346,37 +690,13 @@ class DatabaseExport:
             >>> DatabaseExport.__check_same_shape__([1, 2, [3, 4]], [5, 6, {7, 8}], depth=2)
             False
         """
-        # check if the collections are valid
-        if not isinstance(collection1, (list, tuple)) or not isinstance(collection2, (list, tuple)):
-            raise ValueError("Invalid collections")
-
-        # check if the depth is valid
-        if depth is not None and (not isinstance(depth, int) or depth < 0):
-            raise ValueError("Invalid depth")
-
-        # check if the collections are empty
-        if not collection1 or not collection2:
-            return False
-
-        # check if the collections have the same length
-        if len(collection1) != len(collection2):
+        try:
+            check_same_shape(collection1, collection2, depth)
+        except ShapeMismatchError:
             return False
-
-        # check if the depth is zero
-        if depth == 0:
-            return True
-
-        # check if the collections have the same shape recursively up to the given depth
-        return all(DatabaseExport.__check_same_shape__(item1, item2, depth - 1 if depth is not None else None) if
-                   isinstance(item1, (list, tuple)) and isinstance(item2, (list, tuple))
-                   else not isinstance(item1, (list, tuple)) ^ isinstance(item2, (list, tuple))
-                   for item1, item2 in zip(collection1, collection2))
-        # Note: The XOR operator (^) is used to check if the items have different types.
-        # This avoids raising an exception when one item is a nested collection and the other is not,
-        # and returns False as expected.
+        return True
 
     @staticmethod
     def __resource_path__(relative_path_from_project_root: str):
         """ Get absolute path to resource, works for dev and for PyInstaller """
-        base_path = getattr(sys, '_MEIPASS', definitions.project_root)
-        return os.path.normpath(os.path.join(base_path, relative_path_from_project_root))
+        return resource_path(relative_path_from_project_root)
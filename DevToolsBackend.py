@@ -0,0 +1,613 @@
+import asyncio, atexit, base64, io, itertools, json, os, pathlib, re, shutil, subprocess, tempfile, threading
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+from sub.DB_Table_Export.LayoutEstimator import LayoutEstimator
+from sub.DB_Table_Export.PdfBackends import PdfBackend, calculate_page_setup, estimate_page_setup
+
+# environment variable pointing at the Chrome or Chromium binary to print with
+CHROME_ENV = "DB_EXPORT_CHROME"
+
+# the line Chrome prints to stderr once it listens on the remote debugging port
+_ENDPOINT_PATTERN = re.compile(r"DevTools listening on (ws://\S+)")
+
+# the largest single protocol message read from the pipe, PDF data comes in chunks of stream_chunk_size
+_MESSAGE_LIMIT = 64 * 1024 * 1024
+
+# resolves once the document and all its resources are loaded, without polling
+_LOAD_PROMISE = "document.readyState === 'complete' || new Promise(resolve => window.addEventListener('load', resolve))"
+
+_CONTENT_SIZE = "(() => { const rect = document.querySelector('.content').getBoundingClientRect(); " \
+                "return [rect.width, rect.height]; })()"
+
+
+def find_chrome() -> Optional[str]:
+    """
+    Finds the Chrome or Chromium binary, the DB_EXPORT_CHROME environment variable takes precedence.
+
+    Returns:
+        Optional[str]: The path of the binary, or None if no installation was found.
+    """
+    chrome_path = os.environ.get(CHROME_ENV)
+    if chrome_path:
+        return chrome_path if os.path.isfile(chrome_path) else None
+
+    for candidate in ("chrome", "google-chrome", "google-chrome-stable", "chromium", "chromium-browser"):
+        chrome_path = shutil.which(candidate)
+        if chrome_path:
+            return chrome_path
+    for variable in ("PROGRAMFILES", "PROGRAMFILES(X86)", "LOCALAPPDATA"):
+        base = os.environ.get(variable)
+        if base:
+            chrome_path = os.path.join(base, "Google", "Chrome", "Application", "chrome.exe")
+            if os.path.isfile(chrome_path):
+                return chrome_path
+    chrome_path = "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
+    return chrome_path if os.path.isfile(chrome_path) else None
+
+
+class DevToolsError(RuntimeError):
+    def __init__(self, message: str, code: int = None):
+        """
+        Raised when a DevTools command fails or the browser closed the connection.
+
+        Args:
+            message (str): The error message.
+            code (int, optional): The protocol error code, None if the connection failed. Defaults to None.
+        """
+        self.code = code
+        super().__init__(message)
+
+
+class _PipeTransport:
+    """ Messages over --remote-debugging-pipe, NUL terminated JSON on the file descriptors 3 and 4 of Chrome. """
+
+    def __init__(self, reader: asyncio.StreamReader, read_transport: asyncio.ReadTransport,
+                 writer: asyncio.WriteTransport):
+        self._reader = reader
+        self._read_transport = read_transport
+        self._writer = writer
+
+    async def send(self, message: str) -> None:
+        self._writer.write(message.encode("utf-8") + b"\0")
+
+    async def receive(self) -> Optional[str]:
+        try:
+            data = await self._reader.readuntil(b"\0")
+        except asyncio.IncompleteReadError:
+            return None
+        return data[:-1].decode("utf-8")
+
+    async def close(self) -> None:
+        self._writer.close()
+        self._read_transport.close()
+
+
+class _WebSocketTransport:
+    """ Messages over the websocket of --remote-debugging-port, used where the pipe is not available. """
+
+    def __init__(self, websocket):
+        self._websocket = websocket
+
+    async def send(self, message: str) -> None:
+        await self._websocket.send(message)
+
+    async def receive(self) -> Optional[str]:
+        from websockets.exceptions import ConnectionClosed
+        try:
+            return await self._websocket.recv()
+        except ConnectionClosed:
+            return None
+
+    async def close(self) -> None:
+        await self._websocket.close()
+
+
+class DevToolsPage:
+    def __init__(self, browser: "DevToolsBrowser", target_id: str, session_id: str):
+        """
+        A tab of a DevToolsBrowser, its commands are sent over the shared connection with its session id.
+
+        Args:
+            browser (DevToolsBrowser): The browser the tab belongs to.
+            target_id (str): The id of the tab.
+            session_id (str): The id of the flattened session attached to the tab.
+        """
+        self.browser = browser
+        self.target_id = target_id
+        self.session_id = session_id
+        self._closed = False
+
+    async def send(self, method: str, params: dict = None) -> dict:
+        """ Sends a command to the tab, see DevToolsBrowser.send. """
+        return await self.browser.send(method, params, self.session_id)
+
+    async def load(self, url: str = None, html: str = None, timeout: float = 5.0) -> None:
+        """
+        Opens a url or replaces the document with an HTML source and waits for its load event.
+
+        Args:
+            url (str, optional): The url to open. Defaults to None.
+            html (str, optional): The HTML source to show instead of a url. Defaults to None.
+            timeout (float, optional): Seconds to wait for the load event. Defaults to 5.
+
+        Raises:
+            asyncio.TimeoutError: If the page did not load in time.
+            DevToolsError: If the url could not be opened.
+        """
+        if html is None:
+            loaded = self.browser.listen("Page.loadEventFired", self.session_id)
+            result = await self.send("Page.navigate", {"url": url})
+            if result.get("errorText"):
+                loaded.cancel()
+                raise DevToolsError(f"Could not open {url}: {result['errorText']}")
+            await asyncio.wait_for(loaded, timeout)
+        else:
+            frame_id = (await self.send("Page.getFrameTree"))["frameTree"]["frame"]["id"]
+            await self.send("Page.setDocumentContent", {"frameId": frame_id, "html": html})
+            await asyncio.wait_for(self.send("Runtime.evaluate", {"expression": _LOAD_PROMISE, "awaitPromise": True}),
+                                   timeout)
+
+    async def content_size(self) -> Tuple[float, float]:
+        """ Returns the width and height of the element with the content class in css pixels. """
+        result = await self.send("Runtime.evaluate", {"expression": _CONTENT_SIZE, "returnByValue": True})
+        width, height = result["result"]["value"]
+        return width, height
+
+    async def write_pdf(self, params: dict, output: BinaryIO) -> None:
+        """
+        Prints the page with Page.printToPDF and writes the document to a binary stream chunk by chunk,
+        so the whole document is never held as one base64 string.
+
+        Args:
+            params (dict): The parameters of Page.printToPDF, the transfer mode is always ReturnAsStream.
+            output (BinaryIO): The stream to write to.
+        """
+        result = await self.send("Page.printToPDF", dict(params, transferMode="ReturnAsStream"))
+        handle = result["stream"]
+        try:
+            while True:
+                chunk = await self.send("IO.read", {"handle": handle, "size": self.browser.stream_chunk_size})
+                data = chunk.get("data", "")
+                output.write(base64.b64decode(data) if chunk.get("base64Encoded") else data.encode("utf-8"))
+                if chunk.get("eof"):
+                    break
+        finally:
+            await self.send("IO.close", {"handle": handle})
+
+    async def close(self) -> None:
+        """ Closes the tab, so the browser can open the next one. """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self.browser.send("Target.closeTarget", {"targetId": self.target_id})
+        except DevToolsError:
+            pass
+        finally:
+            self.browser.forget_listeners(self.session_id)
+            self.browser.page_slots.release()
+
+
+class DevToolsBrowser:
+    def __init__(self, chrome_path: str = None, use_pipe: bool = None, max_pages: int = 4,
+                 startup_timeout: float = 20.0, stream_chunk_size: int = 1024 * 1024, command_timeout: float = 60.0):
+        """
+        Headless Chrome driven directly over the DevTools protocol with asyncio, without chromedriver.
+
+        The browser is started on first use and keeps running until close is called. Every page gets its own
+        tab and flattened session on the one connection, so several pages print at the same time.
+
+        Args:
+            chrome_path (str, optional): The Chrome or Chromium binary. When None, see find_chrome. Defaults to None.
+            use_pipe (bool, optional): Whether to talk to Chrome over --remote-debugging-pipe. Otherwise a random
+                debugging port is opened and the websockets package is needed. When None, the pipe is used on
+                POSIX systems. Defaults to None.
+            max_pages (int, optional): The maximum number of tabs open at the same time. Defaults to 4.
+            startup_timeout (float, optional): Seconds to wait for the debugging port. Defaults to 20.
+            stream_chunk_size (int, optional): The number of bytes read at once from a printed PDF. Defaults to 1 MiB.
+            command_timeout (float, optional): Seconds to wait for the response to a command, so a browser that
+                stopped answering does not block the export forever. Defaults to 60.
+
+        Raises:
+            ValueError: If max_pages is smaller than 1.
+        """
+        if max_pages < 1:
+            raise ValueError("Invalid number of pages")
+
+        self.chrome_path = chrome_path
+        self.use_pipe = os.name == "posix" if use_pipe is None else use_pipe
+        self.max_pages = max_pages
+        self.startup_timeout = startup_timeout
+        self.stream_chunk_size = stream_chunk_size
+        self.command_timeout = command_timeout
+
+        # the asyncio primitives are created on the event loop the browser runs on
+        self.page_slots: Optional[asyncio.Semaphore] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._transport = None
+        self._tasks: List[asyncio.Future] = []
+        self._user_data_dir: Optional[str] = None
+        self._connected = False
+        self._ids = itertools.count(1)
+        # message id -> future of the response
+        self._pending: Dict[int, asyncio.Future] = {}
+        # (event, session id) -> futures resolved by the next such event
+        self._listeners: Dict[Tuple[str, Optional[str]], List[asyncio.Future]] = {}
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def start(self) -> None:
+        """
+        Starts Chrome unless it is already running, a crashed browser is restarted.
+
+        Raises:
+            FileNotFoundError: If no Chrome installation was found.
+            DevToolsError: If Chrome exited before the connection was established.
+        """
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+            self.page_slots = asyncio.Semaphore(self.max_pages)
+
+        async with self._start_lock:
+            if self._connected:
+                return
+            if self._process is not None:
+                print("    restarting crashed Chrome")
+                await self.__shutdown()
+
+            chrome_path = self.chrome_path or find_chrome()
+            if chrome_path is None:
+                raise FileNotFoundError(f"Chrome was not found, set the {CHROME_ENV} environment variable")
+
+            self._user_data_dir = tempfile.mkdtemp(prefix="db_export_chrome_")
+            args = [chrome_path, "--headless=new", "--window-size=1920,1080", "--no-sandbox", "--disable-gpu",
+                    "--disable-dev-shm-usage", "--no-first-run", "--no-default-browser-check", "--log-level=3",
+                    f"--user-data-dir={self._user_data_dir}"]
+            try:
+                if self.use_pipe:
+                    self._transport = await self.__launch_pipe(args)
+                else:
+                    self._transport = await self.__launch_port(args)
+            except BaseException:
+                await self.__shutdown()
+                raise
+
+            self._connected = True
+            self._tasks.append(asyncio.ensure_future(self.__read_loop()))
+
+    async def close(self) -> None:
+        """ Closes the browser and removes its profile. """
+        if self._start_lock is None:
+            return
+        async with self._start_lock:
+            if self._connected:
+                try:
+                    await asyncio.wait_for(self.send("Browser.close"), 2)
+                except (DevToolsError, asyncio.TimeoutError):
+                    pass
+            await self.__shutdown()
+
+    async def send(self, method: str, params: dict = None, session_id: str = None) -> dict:
+        """
+        Sends a command and waits for its response.
+
+        Args:
+            method (str): The command, e.g. "Page.navigate".
+            params (dict, optional): The parameters of the command. Defaults to None.
+            session_id (str, optional): The session of the tab to send to, None for the browser. Defaults to None.
+
+        Returns:
+            dict: The result of the command.
+
+        Raises:
+            DevToolsError: If the command failed, got no response within command_timeout
+                or the browser is not connected.
+        """
+        if not self._connected:
+            raise DevToolsError("The browser is not connected")
+
+        message_id = next(self._ids)
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id is not None:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        try:
+            await self._transport.send(json.dumps(message))
+            return await asyncio.wait_for(future, self.command_timeout)
+        except asyncio.TimeoutError:
+            raise DevToolsError(f"{method} got no response within {self.command_timeout} seconds") from None
+        finally:
+            self._pending.pop(message_id, None)
+
+    def listen(self, event: str, session_id: str = None) -> asyncio.Future:
+        """
+        Returns a future resolved with the parameters of the next event of a session. Register it before
+        sending the command that causes the event, so the event can not be missed.
+
+        Args:
+            event (str): The event, e.g. "Page.loadEventFired".
+            session_id (str, optional): The session of the tab, None for browser events. Defaults to None.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._listeners.setdefault((event, session_id), []).append(future)
+        return future
+
+    def forget_listeners(self, session_id: str) -> None:
+        """ Cancels the listeners of a closed session. """
+        for key in [key for key in self._listeners if key[1] == session_id]:
+            for future in self._listeners.pop(key):
+                future.cancel()
+
+    async def new_page(self) -> DevToolsPage:
+        """
+        Opens a blank tab, waiting while max_pages tabs are open. Close the page when done.
+
+        Returns:
+            DevToolsPage: The tab with the page domain enabled.
+        """
+        await self.start()
+        await self.page_slots.acquire()
+        try:
+            target_id = (await self.send("Target.createTarget", {"url": "about:blank"}))["targetId"]
+            session_id = (await self.send("Target.attachToTarget", {"targetId": target_id, "flatten": True}))["sessionId"]
+            page = DevToolsPage(self, target_id, session_id)
+            await page.send("Page.enable")
+            return page
+        except BaseException:
+            self.page_slots.release()
+            raise
+
+    async def print_pdf(self, params: dict, url: str = None, html: str = None, timeout: float = 5.0) -> bytes:
+        """
+        Prints a url or an HTML source in a new tab, see DevToolsPage.load and DevToolsPage.write_pdf.
+        Calls may run concurrently, e.g. with asyncio.gather, up to max_pages print at the same time.
+
+        Returns:
+            bytes: The PDF document.
+        """
+        page = await self.new_page()
+        try:
+            await page.load(url, html, timeout)
+            output = io.BytesIO()
+            await page.write_pdf(params, output)
+            return output.getvalue()
+        finally:
+            await page.close()
+
+    async def __launch_pipe(self, args: List[str]):
+        # chrome reads the commands from fd 3 and writes the responses to fd 4
+        command_read, command_write = os.pipe()
+        response_read, response_write = os.pipe()
+
+        # a preexec_fn runs python between fork and exec, which can deadlock in a process with threads, so the ends
+        # are passed as stdin and stdout, which subprocess maps safely, and the shell moves them to 3 and 4
+        try:
+            self._process = await asyncio.create_subprocess_exec(
+                "/bin/sh", "-c", 'exec "$@" 3<&0 4>&1 </dev/null >/dev/null', "sh",
+                *args, "--remote-debugging-pipe", "about:blank",
+                stdin=command_read, stdout=response_write, stderr=subprocess.DEVNULL)
+        finally:
+            os.close(command_read)
+            os.close(response_write)
+
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=_MESSAGE_LIMIT)
+        read_transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader),
+                                                         os.fdopen(response_read, "rb", 0))
+        writer, _ = await loop.connect_write_pipe(asyncio.Protocol, os.fdopen(command_write, "wb", 0))
+        return _PipeTransport(reader, read_transport, writer)
+
+    async def __launch_port(self, args: List[str]):
+        import websockets
+
+        self._process = await asyncio.create_subprocess_exec(
+            *args, "--remote-debugging-port=0", "about:blank", stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+
+        endpoint = None
+        while endpoint is None:
+            line = await asyncio.wait_for(self._process.stderr.readline(), self.startup_timeout)
+            if not line:
+                raise DevToolsError("Chrome exited before the DevTools endpoint was ready")
+            match = _ENDPOINT_PATTERN.search(line.decode("utf-8", errors="replace"))
+            if match:
+                endpoint = match.group(1)
+        # keep reading stderr, so Chrome never blocks on a full pipe
+        self._tasks.append(asyncio.ensure_future(self.__drain(self._process.stderr)))
+
+        websocket = await websockets.connect(endpoint, max_size=None)
+        return _WebSocketTransport(websocket)
+
+    async def __read_loop(self) -> None:
+        error = DevToolsError("The browser closed the connection")
+        try:
+            while True:
+                message = await self._transport.receive()
+                if message is None:
+                    break
+                self.__dispatch(json.loads(message))
+        except Exception as e:
+            # e.g. a message over _MESSAGE_LIMIT or invalid JSON, the connection can not be read any further
+            error = DevToolsError(f"Could not read the message of the browser: {e!r}")
+            error.__cause__ = e
+
+        # the connection is gone, fail everything that still waits for it, the next start restarts the browser
+        self._connected = False
+        for future in itertools.chain(self._pending.values(), *self._listeners.values()):
+            if not future.done():
+                future.set_exception(error)
+        self._listeners.clear()
+
+    def __dispatch(self, message: dict) -> None:
+        if "id" in message:
+            future = self._pending.get(message["id"])
+            if future is None or future.done():
+                return
+            if "error" in message:
+                error = message["error"]
+                future.set_exception(DevToolsError(error.get("message", "Unknown error"), error.get("code")))
+            else:
+                future.set_result(message.get("result", {}))
+        else:
+            key = (message.get("method"), message.get("sessionId"))
+            for future in self._listeners.pop(key, []):
+                if not future.done():
+                    future.set_result(message.get("params", {}))
+
+    async def __shutdown(self) -> None:
+        self._connected = False
+        if self._transport is not None:
+            await self._transport.close()
+            self._transport = None
+
+        if self._process is not None:
+            try:
+                await asyncio.wait_for(self._process.wait(), 5)
+            except asyncio.TimeoutError:
+                self._process.kill()
+                await self._process.wait()
+            self._process = None
+
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._user_data_dir is not None:
+            shutil.rmtree(self._user_data_dir, ignore_errors=True)
+            self._user_data_dir = None
+
+    @staticmethod
+    async def __drain(stream: asyncio.StreamReader) -> None:
+        while await stream.read(64 * 1024):
+            pass
+
+
+class DevToolsPdfBackend(PdfBackend):
+    def __init__(self, chrome_path: str = None, layout_estimator: LayoutEstimator = None,
+                 load_timeout: float = 5.0, max_pages: int = 4, use_pipe: bool = None):
+        """
+        Prints the rendered HTML with a DevToolsBrowser, without Selenium and chromedriver.
+
+        The browser runs on an event loop thread owned by the backend and stays warm until close is called.
+        render may be called from several threads at once, e.g. by convert_html_to_pdf_chunked with workers,
+        the pages then print concurrently in the one browser.
+
+        Args:
+            chrome_path (str, optional): The Chrome or Chromium binary. When None, see find_chrome. Defaults to None.
+            layout_estimator (LayoutEstimator, optional): Predicts the content size to calculate orientation and
+                scale before the browser is used, see ChromePdfBackend. When None, the loaded page is measured.
+                Defaults to None.
+            load_timeout (float, optional): Seconds to wait for the load event before the conversion is
+                aborted. Defaults to 5.
+            max_pages (int, optional): The maximum number of pages printed at the same time. Defaults to 4.
+            use_pipe (bool, optional): See DevToolsBrowser. Defaults to None.
+        """
+        self.browser = DevToolsBrowser(chrome_path, use_pipe, max_pages)
+        self.layout_estimator = layout_estimator
+        self.load_timeout = load_timeout
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closes_at_exit = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def cache_key(self) -> tuple:
+        # the estimated scale depends on the template metrics
+        return (type(self).__name__, None if self.layout_estimator is None else self.layout_estimator.cache_key())
+
+    def render(self, export, is_landscape: bool = None, print_background: bool = True, paper_format: str = "a4",
+               scale: float = None, html: str = None) -> Union[bytes, None]:
+        output = io.BytesIO()
+        if not self.write(export, output, is_landscape, print_background, paper_format, scale, html):
+            return None
+        return output.getvalue()
+
+    def write(self, export, output: BinaryIO, is_landscape: bool = None, print_background: bool = True,
+              paper_format: str = "a4", scale: float = None, html: str = None) -> bool:
+        """
+        Writes the PDF document chunk by chunk to a binary stream, see PdfBackend.render for the arguments.
+
+        Returns:
+            bool: False if the page did not load in time and nothing was written.
+        """
+        is_landscape, scale = estimate_page_setup(export, self.layout_estimator, paper_format, is_landscape, scale)
+
+        with export.stats.stage("driver_startup"):
+            page = self.__run(self.browser.new_page())
+        try:
+            with export.stats.stage("page_load"):
+                try:
+                    if html is None:
+                        url = pathlib.Path(export.tmp_html_path).resolve().as_uri()
+                        self.__run(page.load(url=url, timeout=self.load_timeout))
+                    else:
+                        self.__run(page.load(html=html, timeout=self.load_timeout))
+                    print("    HTML page successfully loaded")
+                except asyncio.TimeoutError:
+                    print("    Loading took too much time")
+                    print("    Aborting...")
+                    return False
+
+            # calculate params if None is passed
+            if is_landscape is None or scale is None:
+                with export.stats.stage("layout_measurement"):
+                    content_width, content_height = self.__run(page.content_size())
+                is_landscape, scale = calculate_page_setup(content_width, content_height,
+                                                           export.format_dict[paper_format], is_landscape, scale)
+
+            params = {'landscape': is_landscape, 'printBackground': print_background, 'scale': scale,
+                      'paperWidth': export.format_dict[paper_format][0],
+                      'paperHeight': export.format_dict[paper_format][1]}
+            with export.stats.stage("print_to_pdf"):
+                self.__run(page.write_pdf(params, output))
+            export.page_setup = (is_landscape, scale)
+            return True
+        finally:
+            self.__run(page.close())
+
+    def close(self) -> None:
+        """ Closes the browser and stops the event loop thread, the next render starts them again. """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.browser.close(), loop).result()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+            # the asyncio primitives of the browser belonged to the stopped loop
+            self.browser = DevToolsBrowser(self.browser.chrome_path, self.browser.use_pipe, self.browser.max_pages,
+                                           self.browser.startup_timeout, self.browser.stream_chunk_size,
+                                           self.browser.command_timeout)
+
+    def __run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.__event_loop()).result()
+
+    def __event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="DevToolsLoop", daemon=True)
+                self._thread.start()
+                # the pipe closes with the process, but a browser on a debugging port has to be closed
+                if not self._closes_at_exit:
+                    atexit.register(self.close)
+                    self._closes_at_exit = True
+            return self._loop
@@ -0,0 +1,391 @@
+import os, sys, json, time, threading, contextlib, subprocess
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+# selenium and chromedriver_autoinstaller_fix are imported when the first driver is created,
+# so exports without the Chrome backend never load them
+if TYPE_CHECKING:
+    from selenium import webdriver
+
+
+def resource_path(relative_path_from_project_root: str) -> str:
+    """ Get absolute path to resource, works for dev and for PyInstaller """
+    base_path = getattr(sys, '_MEIPASS', None)
+    if base_path is None:
+        import definitions
+        base_path = definitions.project_root
+    return os.path.normpath(os.path.join(base_path, relative_path_from_project_root))
+
+
+# environment variable pointing at a preinstalled chromedriver binary, skips the version probe and download
+CHROMEDRIVER_ENV = "DB_EXPORT_CHROMEDRIVER"
+
+
+class ChromedriverResolver:
+    def __init__(self, driver_dir: str = None, driver_path: str = None, cache_file: str = "chromedriver_versions.json"):
+        """
+        Finds the chromedriver binary once per process instead of probing and installing it for every driver.
+
+        An explicit driver path or the DB_EXPORT_CHROMEDRIVER environment variable is used as is.
+        Otherwise the installed Chrome version is detected and looked up in a JSON file mapping versions to
+        driver paths, so chromedriver_autoinstaller_fix only runs, and may download, when the Chrome version changed.
+
+        Args:
+            driver_dir (str, optional): The directory drivers are installed to and the cache file is kept in.
+                When None, tmp_files/drivers in the project root is used. Defaults to None.
+            driver_path (str, optional): A preinstalled chromedriver binary. Defaults to None.
+            cache_file (str, optional): The name of the cache file in the driver directory.
+                Defaults to "chromedriver_versions.json".
+        """
+        self.driver_dir = driver_dir
+        self.driver_path = driver_path
+        self.cache_file = cache_file
+
+        self._resolved = False
+        self._path: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def resolve(self) -> Optional[str]:
+        """
+        Returns the path of the chromedriver matching the installed Chrome, resolving it on the first call only.
+
+        Returns:
+            Optional[str]: The driver path, or None if it could not be installed, selenium then searches the PATH.
+
+        Raises:
+            FileNotFoundError: If an explicitly given driver does not exist.
+        """
+        with self._lock:
+            if not self._resolved:
+                self._path = self.__resolve()
+                self._resolved = True
+            return self._path
+
+    def invalidate(self) -> None:
+        """ Resolves the driver again on the next call, e.g. after Chrome was updated while the process runs. """
+        with self._lock:
+            self._resolved = False
+            self._path = None
+
+    def __resolve(self) -> Optional[str]:
+        driver_path = self.driver_path or os.environ.get(CHROMEDRIVER_ENV)
+        if driver_path:
+            if not os.path.isfile(driver_path):
+                raise FileNotFoundError(f"The chromedriver {driver_path} does not exist")
+            print(f"    using chromedriver {driver_path}")
+            return driver_path
+
+        # get the accurate chromedriver path (needed to do like this for the compiled exe version)
+        driver_dir = self.driver_dir or resource_path('./tmp_files/drivers/')
+        cache_path = os.path.join(driver_dir, self.cache_file)
+
+        import chromedriver_autoinstaller_fix
+
+        # the version probe only asks the local Chrome, the download is what makes install slow
+        try:
+            chrome_version = chromedriver_autoinstaller_fix.get_chrome_version()
+        except Exception:
+            chrome_version = None
+
+        cache = self.__load_cache(cache_path)
+        cached_path = cache.get(chrome_version) if chrome_version else None
+        if cached_path and os.path.isfile(cached_path):
+            print(f"    chromedriver for Chrome {chrome_version} found")
+            return cached_path
+
+        # install or update the chromedriver if needed
+        installed_path = chromedriver_autoinstaller_fix.install(cwd=False, path=driver_dir)
+        if not installed_path:
+            return None
+
+        if chrome_version:
+            cache[chrome_version] = os.path.abspath(installed_path)
+            self.__save_cache(cache_path, cache)
+        return installed_path
+
+    @staticmethod
+    def __load_cache(cache_path: str) -> dict:
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                cache = json.load(f)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def __save_cache(cache_path: str, cache: dict) -> None:
+        # replace the file at once, so a concurrent process never reads a partial cache
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f, indent=2)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+
+
+# shared by all drivers of the process
+chromedriver_resolver = ChromedriverResolver()
+
+
+def create_chrome_driver(driver_path: str = None) -> "webdriver.Chrome":
+    """
+    Creates a new headless Chrome driver, installing or updating the chromedriver if needed.
+
+    Args:
+        driver_path (str, optional): A preinstalled chromedriver binary. When None, the driver is found by
+            the shared chromedriver_resolver. Defaults to None.
+
+    Returns:
+        webdriver.Chrome: A freshly started headless Chrome driver.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    # define chromedriver options
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument("--log-level=3")
+
+    # the driver is only probed and installed on the first call of the process
+    if driver_path is None:
+        driver_path = chromedriver_resolver.resolve()
+
+    # create the chrome_service from path and set flags appropriately
+    chrome_service = Service(executable_path=driver_path, log_path=os.devnull)
+    # hides the console window of the chromedriver on Windows, the flag does not exist elsewhere
+    chrome_service.creation_flags = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+    # finally create our driver object
+    driver = webdriver.Chrome(service=chrome_service, options=options)
+    return driver
+
+
+@contextlib.contextmanager
+def single_use_driver():
+    """ Context manager yielding a fresh driver that is quit on exit, used when no pool is given. """
+    driver = create_chrome_driver()
+    try:
+        yield driver
+    finally:
+        driver.quit()
+
+
+class ChromeDriverPool:
+    def __init__(self, size: int = 2, idle_timeout: float = 300.0,
+                 driver_factory: Callable[[], "webdriver.Chrome"] = create_chrome_driver):
+        """
+        Initializes a pool of reusable headless Chrome drivers.
+
+        Drivers are started lazily on first use, handed out warm afterwards and reset to a blank page
+        with cleared cookies and cache between jobs. Crashed drivers are quit and replaced on the next request.
+
+        Args:
+            size (int, optional): The maximum number of drivers alive at the same time. Defaults to 2.
+            idle_timeout (float, optional): Seconds after which an unused driver is quit. Idle drivers are
+                reaped whenever the pool is accessed. Defaults to 300.
+            driver_factory (Callable, optional): Callable creating a new driver. Defaults to create_chrome_driver.
+
+        Raises:
+            ValueError: If size is smaller than 1.
+        """
+        if size < 1:
+            raise ValueError("Invalid pool size")
+
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.driver_factory = driver_factory
+
+        # idle drivers together with the time they were last released
+        self._idle: List[Tuple["webdriver.Chrome", float]] = []
+        # number of drivers currently alive, idle or in use
+        self._alive = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def acquire(self, timeout: Optional[float] = None) -> "webdriver.Chrome":
+        """
+        Hands out a warm driver, starting a new one if the pool is not exhausted.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a free driver. Waits forever when None. Defaults to None.
+
+        Returns:
+            webdriver.Chrome: A driver showing a blank page.
+
+        Raises:
+            RuntimeError: If the pool is closed.
+            TimeoutError: If no driver became available within the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            driver, expired = None, []
+            try:
+                with self._condition:
+                    while True:
+                        if self._closed:
+                            raise RuntimeError("The driver pool is closed")
+                        expired.extend(self.__reap_idle())
+
+                        # prefer the most recently used driver, it is the warmest
+                        if self._idle:
+                            driver, _ = self._idle.pop()
+                            break
+
+                        if self._alive < self.size:
+                            self._alive += 1
+                            break
+
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            raise TimeoutError("No chromedriver became available in time")
+                        self._condition.wait(remaining)
+            finally:
+                # drivers are probed, quit and started outside the lock, each of them is a WebDriver request
+                self.__quit_drivers(expired)
+
+            if driver is None:
+                break
+            if self.__is_alive(driver):
+                return driver
+
+            # restart crashed drivers
+            print("    discarding crashed chromedriver")
+            with self._condition:
+                self._alive -= 1
+                self._condition.notify()
+            self.__quit_drivers([driver])
+
+        try:
+            return self.driver_factory()
+        except BaseException:
+            with self._condition:
+                self._alive -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, driver: "webdriver.Chrome", discard: bool = False) -> None:
+        """
+        Returns a driver to the pool after resetting it.
+
+        Args:
+            driver (webdriver.Chrome): The driver previously handed out by acquire.
+            discard (bool, optional): Whether to quit the driver instead of reusing it. Defaults to False.
+        """
+        if not discard:
+            discard = not self.__reset(driver)
+
+        with self._condition:
+            if discard or self._closed:
+                self._alive -= 1
+                expired = [driver]
+            else:
+                self._idle.append((driver, time.monotonic()))
+                expired = []
+            expired.extend(self.__reap_idle())
+            self._condition.notify()
+        self.__quit_drivers(expired)
+
+    @contextlib.contextmanager
+    def driver(self, timeout: Optional[float] = None):
+        """
+        Context manager around acquire and release. A driver raising a WebDriverException is discarded.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a free driver. Defaults to None.
+        """
+        from selenium.common.exceptions import WebDriverException
+
+        driver = self.acquire(timeout)
+        discard = False
+        try:
+            yield driver
+        except WebDriverException:
+            discard = True
+            raise
+        finally:
+            self.release(driver, discard=discard)
+
+    def close(self) -> None:
+        """ Quits all idle drivers. Drivers still in use are quit when they are released. """
+        with self._condition:
+            self._closed = True
+            idle = [driver for driver, _ in self._idle]
+            self._idle = []
+            self._alive -= len(idle)
+            self._condition.notify_all()
+        self.__quit_drivers(idle)
+
+    def __reap_idle(self) -> List["webdriver.Chrome"]:
+        # must be called with the condition held, returns the expired drivers to quit after releasing it
+        if self.idle_timeout is None:
+            return []
+        now = time.monotonic()
+        keep, expired = [], []
+        for driver, released_at in self._idle:
+            if now - released_at > self.idle_timeout:
+                expired.append(driver)
+            else:
+                keep.append((driver, released_at))
+        self._idle = keep
+        self._alive -= len(expired)
+        return expired
+
+    @staticmethod
+    def __quit_drivers(drivers: List["webdriver.Chrome"]) -> None:
+        # must be called without the condition held, quitting waits for the browser to exit
+        if not drivers:
+            return
+        from selenium.common.exceptions import WebDriverException
+
+        for driver in drivers:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+    @staticmethod
+    def __is_alive(driver: "webdriver.Chrome") -> bool:
+        from selenium.common.exceptions import WebDriverException
+
+        try:
+            driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    @staticmethod
+    def __reset(driver: "webdriver.Chrome") -> bool:
+        # bring the driver back to a clean state, returns False if it could not be reset
+        from selenium.common.exceptions import WebDriverException
+
+        try:
+            # close any windows the job opened besides the first one
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+
+            driver.get("about:blank")
+            driver.delete_all_cookies()
+            driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        except WebDriverException:
+            return False
+
+        # local reports are served from file://, clear whatever storage they may have left behind
+        try:
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": "file://", "storageTypes": "all"})
+        except WebDriverException:
+            pass
+        return True
@@ -0,0 +1,116 @@
+import threading
+from typing import Dict, List, Set
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from sub.DB_Table_Export.DBExport import DatabaseExport
+
+
+# Define the signals of the worker, QRunnable itself can not emit signals
+class ExportSignals(QObject):
+    # stage description and percentage
+    progress = pyqtSignal(str, int)
+    # html and pdf path, empty if not created
+    finished = pyqtSignal(str, str)
+    # error message
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class ExportWorker(QRunnable):
+    def __init__(self, db_export: DatabaseExport, headers: List[str], rows: list, colors_list: list,
+                 result: Dict[str, bool], is_landscape: bool = None, scale: float = None,
+                 column_styles: Dict[int, str] = None):
+        """
+        Renders and prints a report off the GUI thread, from data that was already read from the table widget.
+
+        Args:
+            db_export (DatabaseExport): The export to run.
+            headers (List[str]): The table headers.
+            rows (list): The table rows.
+            colors_list (list): The background styles of the cells.
+            result (Dict[str, bool]): The options chosen in the ReportPopup.
+            is_landscape (bool, optional): Whether the PDF is landscape. When None, get's calculated. Defaults to None.
+            scale (float, optional): The scale factor of the PDF. When None, get's calculated. Defaults to None.
+            column_styles (Dict[int, str], optional): Styles of whole columns, e.g. holidays, see
+                DatabaseExport.create_html. Defaults to None.
+        """
+        super().__init__()
+        # the python side owns the worker, it is kept alive by _running_workers while queued or running
+        self.setAutoDelete(False)
+        self.db_export = db_export
+        self.headers = headers
+        self.rows = rows
+        self.colors_list = colors_list
+        self.result = result
+        self.is_landscape = is_landscape
+        self.scale = scale
+        self.column_styles = column_styles
+
+        self.signals = ExportSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """ Cancels the export, it stops before its next stage or is removed from the queue if it did not start yet. """
+        self._cancelled.set()
+        if export_pool.tryTake(self):
+            self.signals.cancelled.emit()
+
+    def run(self) -> None:
+        try:
+            if self.__stop():
+                return
+
+            self.signals.progress.emit("Creating HTML", 10)
+            html_filename = self.db_export.create_html(self.headers, self.rows, self.colors_list,
+                                                       open_file=self.result['html'],
+                                                       save_file=(self.result['html'] and self.result['save']),
+                                                       column_styles=self.column_styles)
+            if self.__stop():
+                return
+
+            pdf_filename = ""
+            if self.result['pdf']:
+                self.signals.progress.emit("Creating PDF", 50)
+                pdf_filename = self.db_export.convert_html_to_pdf(is_landscape=self.is_landscape, scale=self.scale,
+                                                                  open_file=self.result['pdf'],
+                                                                  save_file=(self.result['pdf'] and self.result['save']))
+                if pdf_filename is None:
+                    raise TimeoutError("Loading the HTML page took too much time")
+
+            self.signals.progress.emit("Done", 100)
+            self.signals.finished.emit(html_filename or "", pdf_filename or "")
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+
+    def __stop(self) -> bool:
+        if self._cancelled.is_set():
+            self.signals.cancelled.emit()
+            return True
+        return False
+
+
+# one export at a time, further exports are queued
+export_pool = QThreadPool()
+export_pool.setMaxThreadCount(1)
+
+# keeps the python side of queued and running workers alive until they are done
+_running_workers: Set[ExportWorker] = set()
+
+
+def start_export(worker: ExportWorker) -> ExportWorker:
+    """
+    Queues the worker on the export thread pool.
+
+    Args:
+        worker (ExportWorker): The worker to run.
+
+    Returns:
+        ExportWorker: The worker, to connect to its signals or cancel it.
+    """
+    _running_workers.add(worker)
+    # released on the GUI thread once the last signal of the worker was delivered
+    for signal in (worker.signals.finished, worker.signals.failed, worker.signals.cancelled):
+        signal.connect(lambda *args: _running_workers.discard(worker))
+    export_pool.start(worker)
+    return worker
@@ -0,0 +1,238 @@
+import argparse, datetime, importlib, json, os, sys
+from typing import Collection, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from sub.DB_Table_Export import REPORT_TYPES
+from sub.DB_Table_Export.ColorCache import instructor_colors
+from sub.DB_Table_Export.ColorMatcher import InstructorColorMatcher
+from sub.DB_Table_Export.DBExport import DatabaseExport
+from sub.DB_Table_Export.DriverPool import ChromeDriverPool, chromedriver_resolver
+from sub.DB_Table_Export.Instrumentation import ExportStats
+from sub.DB_Table_Export.PdfBackends import PdfBackend
+from sub.DB_Table_Export.report_data import TEMPLATES, CHECK_STATE_GLYPHS, weekplan_cell, holiday_column_styles, \
+    rmv_trailing_empty_rows_n_keep_shape
+
+# Headless export of table and weekplan reports straight from a DB-API cursor, without Qt
+
+
+class HeadlessResult(NamedTuple):
+    html_path: Optional[str]
+    pdf_path: Optional[str]
+    # time spent in each stage of the export
+    stats: Optional[ExportStats] = None
+
+
+class ConnectionDatabase:
+    def __init__(self, connection):
+        """ Adapts a DB-API connection to the select(sql) interface used by the color cache. """
+        self.connection = connection
+
+    def select(self, sql: str, params: Sequence = ()):
+        cursor = self.connection.cursor()
+        cursor.execute(sql, params)
+        return cursor
+
+
+def __fetch_in_batches(cursor, batch_size: int) -> Iterator[tuple]:
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+def __cell_text(value) -> str:
+    if value is None:
+        return ""
+    # booleans are shown as checkboxes, like checkable cells in the table widget
+    if isinstance(value, bool):
+        return CHECK_STATE_GLYPHS[2 if value else 0]
+    return str(value)
+
+
+def read_cursor(cursor, report_type: REPORT_TYPES, matcher: InstructorColorMatcher = None,
+                batch_size: int = 500) -> Tuple[List[str], list, List[List[str]]]:
+    """
+    Reads the headers, rows and cell colors of a report from an executed cursor in a single pass.
+
+    Args:
+        cursor: An executed DB-API cursor.
+        report_type (REPORT_TYPES): The report type, weekplan cells are split into their lines.
+        matcher (InstructorColorMatcher, optional): The matcher for the cell colors.
+            When None, all cells are white. Defaults to None.
+        batch_size (int, optional): The number of rows fetched at once with fetchmany. Defaults to 500.
+
+    Returns:
+        Tuple[List[str], list, List[List[str]]]: The headers, the rows and the colors of the cells.
+    """
+    headers = [column[0] for column in cursor.description]
+    rows, colors_list = [], []
+    for record in __fetch_in_batches(cursor, batch_size):
+        texts = [__cell_text(value) for value in record]
+        # empty cells keep the default background, like empty cells of the table widget
+        colors = [matcher.cell_style(text) if matcher is not None and text else "" for text in texts]
+
+        if report_type == REPORT_TYPES.REPORT_WEEKPLAN:
+            rows.append([weekplan_cell(text) for text in texts])
+            colors_list.append(colors)
+        # rows without any data are left out of table reports
+        elif any(texts):
+            rows.append(texts)
+            colors_list.append(colors)
+
+    colors_list, rows = rmv_trailing_empty_rows_n_keep_shape(colors_list, rows)
+    return headers, rows, colors_list
+
+
+def export_from_cursor(cursor, report_type: REPORT_TYPES, report_name: str, output_dir: str, html: bool = True,
+                       pdf: bool = True, color_dict: dict = None, weekdays: Collection = None,
+                       scale: float = None, is_landscape: bool = None, batch_size: int = 500,
+                       pool: ChromeDriverPool = None, stats: ExportStats = None, holiday_subdiv: str = None,
+                       intern_styles: bool = False, backend: PdfBackend = None) -> HeadlessResult:
+    """
+    Creates a table or weekplan report from an executed DB-API cursor, without a GUI.
+
+    Args:
+        cursor: An executed DB-API cursor, its column names are used as headers.
+        report_type (REPORT_TYPES): The report type.
+        report_name (str): The name of the report, which can contain a <split> token to separate the title and the extra title.
+        output_dir (str): The directory to save the reports to.
+        html (bool, optional): Whether to save an HTML report. Defaults to True.
+        pdf (bool, optional): Whether to save a PDF report. Defaults to True.
+        color_dict (dict, optional): A dictionary mapping instructor names to cell colors. Defaults to None.
+        weekdays (Collection, optional): The date of each column, required for weekplans. Defaults to None.
+        scale (float, optional): The scale factor of the PDF. When None, get's calculated. Defaults to None.
+        is_landscape (bool, optional): Whether the PDF is landscape. When None, get's calculated. Defaults to None.
+        batch_size (int, optional): The number of rows fetched at once with fetchmany. Defaults to 500.
+        pool (ChromeDriverPool, optional): A pool to take a warm driver from. Defaults to None.
+        stats (ExportStats, optional): Records the time spent in each stage. When None, a new ExportStats
+            is created. Defaults to None.
+        holiday_subdiv (str, optional): The Austrian state whose holidays are marked in weekplans as well,
+            e.g. "9" for Vienna. Defaults to None.
+        intern_styles (bool, optional): Whether to write the cell styles as css classes, see
+            DatabaseExport.create_html. Defaults to False.
+        backend (PdfBackend, optional): The engine to create the PDF with, e.g. a DevToolsPdfBackend shared by
+            several exports. When None, a ChromePdfBackend with the pool is used. Defaults to None.
+
+    Returns:
+        HeadlessResult: The paths of the saved reports, None for formats that were not requested or failed,
+            and the stage timings.
+
+    Raises:
+        ValueError: If weekdays are missing for the weekplan report type.
+    """
+    if report_type == REPORT_TYPES.REPORT_WEEKPLAN:
+        is_landscape = True
+        if weekdays is None:
+            raise ValueError("Missing required parameters for the weekplan report type")
+
+    if stats is None:
+        stats = ExportStats(report_name)
+
+    matcher = InstructorColorMatcher(color_dict) if color_dict is not None else None
+    with stats.stage("table_extraction"):
+        headers, rows, colors_list = read_cursor(cursor, report_type, matcher, batch_size)
+
+    # Mark holidays on WEEKPLAN report type
+    column_styles = None
+    if report_type == REPORT_TYPES.REPORT_WEEKPLAN:
+        column_styles = holiday_column_styles(weekdays, holiday_subdiv)
+
+    dbExp = DatabaseExport(TEMPLATES[report_type], report_name, output_dir, output_dir, stats=stats)
+    # the temporary files are removed even if the export fails, a long running service would collect them otherwise
+    try:
+        html_path = dbExp.create_html(headers, rows, colors_list, open_file=False, save_file=html,
+                                      intern_styles=intern_styles, column_styles=column_styles)
+        pdf_path = None
+        if pdf:
+            pdf_path = dbExp.convert_html_to_pdf(is_landscape=is_landscape, scale=scale, open_file=False,
+                                                 save_file=True, pool=pool, backend=backend)
+    finally:
+        dbExp.workspace.cleanup()
+
+    return HeadlessResult(html_path if html else None, pdf_path, stats)
+
+
+def export_from_query(connection, sql: str, report_type: REPORT_TYPES, report_name: str, output_dir: str,
+                      params: Sequence = (), with_colors: bool = True, **kwargs) -> HeadlessResult:
+    """
+    Runs a query on a DB-API connection and creates a report from its result, see export_from_cursor.
+
+    Args:
+        connection: A DB-API connection.
+        sql (str): The query returning the report rows.
+        report_type (REPORT_TYPES): The report type.
+        report_name (str): The name of the report.
+        output_dir (str): The directory to save the reports to.
+        params (Sequence, optional): The parameters of the query. Defaults to ().
+        with_colors (bool, optional): Whether to color the cells by the instructor colors of the database,
+            ignored if a color_dict is passed. Defaults to True.
+        **kwargs: Further arguments of export_from_cursor.
+
+    Returns:
+        HeadlessResult: The paths of the saved reports.
+    """
+    db = ConnectionDatabase(connection)
+    if kwargs.get("stats") is None:
+        kwargs["stats"] = ExportStats(report_name)
+    if with_colors and kwargs.get("color_dict") is None:
+        with kwargs["stats"].stage("db_color_fetch"):
+            kwargs["color_dict"] = instructor_colors.get(db)
+
+    cursor = db.select(sql, params)
+    try:
+        return export_from_cursor(cursor, report_type, report_name, output_dir, **kwargs)
+    finally:
+        cursor.close()
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export a database query as HTML and PDF report without a GUI.")
+    parser.add_argument("--driver", default="sqlite3", help="the DB-API module to connect with, e.g. sqlite3 or pymysql")
+    parser.add_argument("--connect", default=None, help="the positional argument of the driver's connect function")
+    parser.add_argument("--connect-kwargs", default="{}", help="keyword arguments of the driver's connect function as JSON")
+    parser.add_argument("--query", required=True, help="the query returning the report rows")
+    parser.add_argument("--type", choices=["table", "weekplan"], default="table", help="the report type")
+    parser.add_argument("--name", required=True, help="the report name")
+    parser.add_argument("--output", default=os.getcwd(), help="the directory to save the reports to")
+    parser.add_argument("--no-html", action="store_true", help="do not save an HTML report")
+    parser.add_argument("--no-pdf", action="store_true", help="do not save a PDF report")
+    parser.add_argument("--no-colors", action="store_true", help="do not color cells by instructor colors")
+    parser.add_argument("--weekdays", default=None, help="comma separated ISO dates of the weekplan columns")
+    parser.add_argument("--batch-size", type=int, default=500, help="the number of rows fetched at once")
+    parser.add_argument("--chromedriver", default=None, help="a preinstalled chromedriver, skips the version check")
+    parser.add_argument("--backend", choices=["chrome", "devtools"], default="chrome",
+                        help="print with Chrome through Selenium, or directly over the DevTools protocol")
+    args = parser.parse_args(argv)
+
+    if args.chromedriver:
+        chromedriver_resolver.driver_path = args.chromedriver
+
+    report_type = REPORT_TYPES.REPORT_WEEKPLAN if args.type == "weekplan" else REPORT_TYPES.REPORT_TABLE
+    kwargs = {}
+    if args.weekdays:
+        weekdays = [datetime.date.fromisoformat(day) for day in args.weekdays.split(",")]
+        kwargs.update(weekdays=weekdays)
+    if args.backend == "devtools" and not args.no_pdf:
+        from sub.DB_Table_Export.DevToolsBackend import DevToolsPdfBackend
+        kwargs["backend"] = DevToolsPdfBackend()
+
+    driver = importlib.import_module(args.driver)
+    connect_args = [args.connect] if args.connect is not None else []
+    connection = driver.connect(*connect_args, **json.loads(args.connect_kwargs))
+    try:
+        result = export_from_query(connection, args.query, report_type, args.name, args.output,
+                                   with_colors=not args.no_colors, html=not args.no_html, pdf=not args.no_pdf,
+                                   batch_size=args.batch_size, **kwargs)
+    finally:
+        connection.close()
+        if "backend" in kwargs:
+            kwargs["backend"].close()
+
+    for path in (result.html_path, result.pdf_path):
+        if path:
+            print(path)
+    return 0 if (args.no_pdf or result.pdf_path) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import datetime, threading
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# holidays is imported on first use, it loads the definitions of every country
+
+# converts the other day types holidays accepts, e.g. timestamps and date strings, like membership tests did before
+_day_parser = None
+
+
+def to_date(day) -> datetime.date:
+    """
+    Converts a weekday of a weekplan to a date.
+
+    Args:
+        day: A date, datetime, QDate or any other value the holidays package accepts, e.g. a date string.
+
+    Returns:
+        datetime.date: The date.
+    """
+    if isinstance(day, datetime.datetime):
+        return day.date()
+    if isinstance(day, datetime.date):
+        return day
+    # QDate, converted without importing Qt
+    if hasattr(day, "toPyDate"):
+        return day.toPyDate()
+
+    global _day_parser
+    if _day_parser is None:
+        import holidays
+        _day_parser = holidays.HolidayBase()
+    return _day_parser.__keytransform__(day)
+
+
+class HolidayCalendar:
+    def __init__(self, country: str = "AT", subdiv: str = None):
+        """
+        Keeps the public holidays of a region, each year is only calculated once and kept across exports.
+
+        Args:
+            country (str, optional): The ISO 3166 country code, see holidays.country_holidays. Defaults to "AT".
+            subdiv (str, optional): The subdivision of the country, e.g. the state "9" for Vienna. Defaults to None.
+        """
+        self.country = country
+        self.subdiv = subdiv
+
+        # year -> holidays of that year
+        self._years: Dict[int, FrozenSet[datetime.date]] = {}
+        self._lock = threading.Lock()
+
+    def dates(self, years: Iterable[int]) -> Set[datetime.date]:
+        """
+        Returns the holidays of the given years, calculating only years that were not requested before.
+
+        Args:
+            years (Iterable[int]): The years.
+
+        Returns:
+            Set[datetime.date]: The dates of the holidays.
+        """
+        years = {int(year) for year in years}
+        with self._lock:
+            missing = [year for year in years if year not in self._years]
+            if missing:
+                import holidays
+                calculated = holidays.country_holidays(self.country, subdiv=self.subdiv, years=missing)
+                for year in missing:
+                    self._years[year] = frozenset(day for day in calculated.keys() if day.year == year)
+            return set().union(*(self._years[year] for year in years))
+
+    def holiday_columns(self, weekdays: Iterable) -> List[int]:
+        """
+        Returns the indexes of the weekdays that are holidays, the weekdays may span several years.
+
+        Args:
+            weekdays (Iterable): The date of each column, see to_date for the accepted types.
+
+        Returns:
+            List[int]: The column indexes.
+        """
+        days = [to_date(day) for day in weekdays]
+        holiday_dates = self.dates({day.year for day in days})
+        return [j for j, day in enumerate(days) if day in holiday_dates]
+
+    def column_styles(self, weekdays: Iterable, style: str) -> Dict[int, str]:
+        """ Returns the given style for every holiday column, as expected by DatabaseExport.create_html. """
+        return {j: style for j in self.holiday_columns(weekdays)}
+
+
+# (country, subdivision) -> shared calendar
+_calendars: Dict[Tuple[str, Optional[str]], HolidayCalendar] = {}
+_calendars_lock = threading.Lock()
+
+
+def get_calendar(country: str = "AT", subdiv: str = None) -> HolidayCalendar:
+    """
+    Returns the shared HolidayCalendar of a region, creating it on first use.
+
+    Args:
+        country (str, optional): The ISO 3166 country code. Defaults to "AT".
+        subdiv (str, optional): The subdivision of the country. Defaults to None.
+
+    Returns:
+        HolidayCalendar: The shared calendar.
+    """
+    key = (country, subdiv)
+    with _calendars_lock:
+        if key not in _calendars:
+            _calendars[key] = HolidayCalendar(country, subdiv)
+        return _calendars[key]
@@ -0,0 +1,165 @@
+import datetime, json, threading, time, tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Union
+
+
+class StageTiming(NamedTuple):
+    """ The measurements of one stage of an export. """
+    export: str
+    stage: str
+    # seconds
+    wall: float
+    cpu: float
+    # bytes allocated by python at most during the stage, None if memory was not traced
+    peak_memory: Optional[int]
+    started: datetime.datetime
+
+
+# called with the stats and the timing of every finished stage
+StageHook = Callable[["ExportStats", StageTiming], None]
+
+# hooks added to every new ExportStats, e.g. a JsonLinesSink for the whole application
+global_hooks: List[StageHook] = []
+
+
+class ExportStats:
+    def __init__(self, export: str = "", trace_memory: bool = False, hooks: Iterable[StageHook] = None):
+        """
+        Records wall time, CPU time and optionally the peak memory of the stages of one export.
+
+        Args:
+            export (str, optional): The name of the export the stages belong to. Defaults to "".
+            trace_memory (bool, optional): Whether to record the peak python memory of each stage with tracemalloc.
+                Tracing slows the export down noticeably, and nested stages share one peak. Defaults to False.
+            hooks (Iterable[StageHook], optional): Callables notified of every finished stage, in addition
+                to the global_hooks. Defaults to None.
+        """
+        self.export = export
+        self.trace_memory = trace_memory
+        self.hooks: List[StageHook] = list(global_hooks) + list(hooks or [])
+        self.stages: List[StageTiming] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measures the enclosed block as a stage, the timing is also recorded if the block raises.
+
+        The CPU time is the one of the calling thread, work done by the browser process is not included.
+
+        Args:
+            name (str): The name of the stage, e.g. "jinja_render".
+        """
+        started = datetime.datetime.now()
+        # only stop tracing that this stage started, an enclosing stage or the application may still need it
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+            peak_memory = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+            if started_tracing:
+                tracemalloc.stop()
+            self.record(StageTiming(self.export, name, wall, cpu, peak_memory, started))
+
+    def record(self, timing: StageTiming) -> None:
+        """ Adds a timing measured elsewhere and notifies the hooks, a failing hook does not stop the export. """
+        with self._lock:
+            self.stages.append(timing)
+        for hook in self.hooks:
+            try:
+                hook(self, timing)
+            except Exception as e:
+                print(f"{datetime.datetime.now()}: stage hook failed: {e}")
+
+    def add_hook(self, hook: StageHook) -> None:
+        self.hooks.append(hook)
+
+    def totals(self) -> Dict[str, float]:
+        """ Returns the summed wall time per stage name, stages run repeatedly, e.g. per PDF slice, are added up. """
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for timing in self.stages:
+                totals[timing.stage] = totals.get(timing.stage, 0.0) + timing.wall
+        return totals
+
+    def as_dicts(self) -> List[dict]:
+        """ Returns the recorded stages as JSON serializable dictionaries. """
+        with self._lock:
+            return [_timing_dict(timing) for timing in self.stages]
+
+    def write_json_lines(self, output: Union[str, TextIO]) -> None:
+        """
+        Appends one JSON object per recorded stage to a file or stream.
+
+        Args:
+            output (Union[str, TextIO]): A path or a writable text stream.
+        """
+        lines = "".join(json.dumps(stage) + "\n" for stage in self.as_dicts())
+        if isinstance(output, str):
+            with open(output, "a", encoding="utf-8") as f:
+                f.write(lines)
+        else:
+            output.write(lines)
+
+    def to_prometheus(self, prefix: str = "dbexport") -> str:
+        """
+        Returns the summed stage times in the Prometheus text exposition format.
+
+        Args:
+            prefix (str, optional): The prefix of the metric names. Defaults to "dbexport".
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        wall: Dict[str, float] = {}
+        cpu: Dict[str, float] = {}
+        peak: Dict[str, int] = {}
+        with self._lock:
+            for timing in self.stages:
+                wall[timing.stage] = wall.get(timing.stage, 0.0) + timing.wall
+                cpu[timing.stage] = cpu.get(timing.stage, 0.0) + timing.cpu
+                if timing.peak_memory is not None:
+                    peak[timing.stage] = max(peak.get(timing.stage, 0), timing.peak_memory)
+
+        export = self.export.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        lines = [f"# TYPE {prefix}_stage_seconds gauge"]
+        for stage in wall:
+            lines.append(f'{prefix}_stage_seconds{{export="{export}",stage="{stage}",clock="wall"}} {wall[stage]:.6f}')
+            lines.append(f'{prefix}_stage_seconds{{export="{export}",stage="{stage}",clock="cpu"}} {cpu[stage]:.6f}')
+        if peak:
+            lines.append(f"# TYPE {prefix}_stage_peak_bytes gauge")
+            for stage, value in peak.items():
+                lines.append(f'{prefix}_stage_peak_bytes{{export="{export}",stage="{stage}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def _timing_dict(timing: StageTiming) -> dict:
+    timing_dict = timing._asdict()
+    timing_dict["started"] = timing.started.isoformat()
+    return timing_dict
+
+
+class JsonLinesSink:
+    def __init__(self, path: str):
+        """
+        A stage hook appending every finished stage as one JSON object to a file, e.g. for global_hooks.
+
+        Args:
+            path (str): The path of the JSON-lines file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, stats: ExportStats, timing: StageTiming) -> None:
+        line = json.dumps(_timing_dict(timing)) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
@@ -0,0 +1,88 @@
+from typing import Dict, NamedTuple, Sequence, Tuple
+
+from sub.DB_Table_Export.NativePdf import text_width, cell_lines
+
+
+class TemplateMetrics(NamedTuple):
+    """ The css sizes of a template's table in pixels, used to predict the size of its .content element. """
+    font_size: float = 16
+    line_height: float = 1.2
+    cell_padding: float = 4
+    border_spacing: float = 2
+    # space of the .content element around the table, e.g. title and extra title
+    extra_width: float = 0
+    extra_height: float = 80
+    # widest a column gets before the browser wraps its text
+    max_column_width: float = 480
+
+
+class LayoutEstimator:
+    def __init__(self, metrics: Dict[str, TemplateMetrics] = None):
+        """
+        Predicts the size of a rendered report from its headers and cell texts with font metrics, so the orientation
+        and scale can be chosen before a browser is used instead of measuring the loaded page.
+
+        The widest line of each column is measured, every distinct line only once.
+
+        Args:
+            metrics (Dict[str, TemplateMetrics], optional): The metrics per template path. Templates without
+                an entry use the default TemplateMetrics. Defaults to None.
+        """
+        self.metrics = dict(metrics or {})
+
+    def cache_key(self) -> tuple:
+        """ Returns the metrics estimates are based on, part of the cache key of backends that use the estimator. """
+        return tuple(sorted(self.metrics.items()))
+
+    def estimate(self, template: str, headers: Sequence[str], rows: Sequence) -> Tuple[float, float]:
+        """
+        Returns the predicted width and height of the .content element in css pixels.
+
+        Args:
+            template (str): The template path.
+            headers (Sequence[str]): The column headers.
+            rows (Sequence): The rows, cells are strings or lists of lines.
+
+        Returns:
+            Tuple[float, float]: The width and height in css pixels.
+        """
+        metrics = self.metrics.get(template, TemplateMetrics())
+        column_widths = [text_width(header, metrics.font_size, bold=True) for header in headers]
+        # reports repeat the same texts a lot, e.g. instructor names
+        widths: Dict[str, float] = {}
+        line_count = 0
+        for row in rows:
+            lines = 1
+            for c, value in enumerate(row):
+                if c >= len(column_widths):
+                    # cells without a header are not rendered as their own column
+                    break
+                cell = cell_lines(value)
+                lines = max(lines, len(cell))
+                for line in cell:
+                    width = widths.get(line)
+                    if width is None:
+                        width = widths[line] = text_width(line, metrics.font_size)
+                    if width > column_widths[c]:
+                        column_widths[c] = width
+            line_count += lines
+
+        return self.__calculate(metrics, column_widths, line_count, len(rows))
+
+    @staticmethod
+    def __calculate(metrics: TemplateMetrics, column_widths: Sequence[float], line_count: int,
+                    row_count: int) -> Tuple[float, float]:
+        cell_extra = 2 * metrics.cell_padding + metrics.border_spacing
+        width = metrics.border_spacing + metrics.extra_width
+        for column in column_widths:
+            width += min(column, metrics.max_column_width) + cell_extra
+
+        line_height = metrics.font_size * metrics.line_height
+        height = metrics.extra_height + metrics.border_spacing + (line_height + cell_extra) \
+            + line_count * line_height + row_count * cell_extra
+        return width, height
+
+
+# shared by all exports of the process
+layout_estimator = LayoutEstimator()
+
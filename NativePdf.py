@@ -0,0 +1,308 @@
+import re, zlib
+from typing import BinaryIO, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Helvetica character widths in 1/1000 em, from the Adobe font metrics of the standard 14 fonts
+HELVETICA_WIDTHS = dict(zip(
+    " !\"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~",
+    [278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+     556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+     1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+     667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+     333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+     556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584]))
+HELVETICA_WIDTHS.update({"ä": 556, "ö": 556, "ü": 556, "Ä": 667, "Ö": 778, "Ü": 722, "ß": 611, "€": 556})
+DEFAULT_WIDTH = 556
+# bold glyphs are about this much wider on average
+BOLD_FACTOR = 1.08
+
+# the checkbox glyphs are not part of the standard fonts
+GLYPH_REPLACEMENTS = {"☐": "[ ]", "▣": "[-]", "☑": "[x]"}
+
+HEX_PATTERN = re.compile(r"#([\da-fA-F]{6}|[\da-fA-F]{3})\b")
+
+# page margin in inches, like the default margin of Chrome's printToPDF
+MARGIN = 0.4
+# css pixels per inch and pdf points per inch
+PX_PER_INCH = 96
+PT_PER_INCH = 72
+
+
+def printable_text(text: str) -> str:
+    for glyph, replacement in GLYPH_REPLACEMENTS.items():
+        text = text.replace(glyph, replacement)
+    return text
+
+
+def text_width(text: str, font_size: float, bold: bool = False) -> float:
+    """
+    Returns the width of a single line of text set in Helvetica.
+
+    Args:
+        text (str): The text.
+        font_size (float): The font size, the width is returned in the same unit.
+        bold (bool, optional): Whether the text is set in bold. Defaults to False.
+
+    Returns:
+        float: The width of the text.
+    """
+    width = sum(HELVETICA_WIDTHS.get(c, DEFAULT_WIDTH) for c in printable_text(text)) * font_size / 1000
+    return width * BOLD_FACTOR if bold else width
+
+
+def cell_lines(value: Union[str, Sequence[str]]) -> List[str]:
+    # weekplan cells are lists of lines, table cells are strings
+    if isinstance(value, str):
+        return value.splitlines() or [""]
+    return list(value) or [""]
+
+
+def background_colors(style: Optional[str]) -> List[Tuple[float, float, float]]:
+    """
+    Returns the colors of a background style as created by InstructorColorMatcher, as rgb fractions.
+
+    Args:
+        style (str): A css declaration like "background-color: #FFFFFF;" or a linear-gradient.
+
+    Returns:
+        List[Tuple[float, float, float]]: The colors in order, empty for no or white background.
+    """
+    colors = []
+    for value in HEX_PATTERN.findall(style or ""):
+        if len(value) == 3:
+            value = "".join(c * 2 for c in value)
+        rgb = tuple(int(value[i:i + 2], 16) / 255 for i in (0, 2, 4))
+        colors.append(rgb)
+    if colors == [(1.0, 1.0, 1.0)]:
+        return []
+    return colors
+
+
+def fit_row(row: Iterable, column_count: int, fill=""):
+    """ Clips or pads a row to the number of columns, so rows with more or fewer cells than headers can be drawn. """
+    row = list(row)[:column_count]
+    return row + [fill] * (column_count - len(row))
+
+
+def _escape(text: str) -> bytes:
+    data = printable_text(text).encode("cp1252", "replace")
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class TableLayout:
+    def __init__(self, headers: Sequence[str], rows: Iterable, font_size: float = 13, padding: float = 4,
+                 max_column_width: float = 320):
+        """
+        Measures a table set in Helvetica, all sizes are in css pixels.
+
+        Args:
+            headers (Sequence[str]): The column headers.
+            rows (Iterable): The rows, cells are strings or lists of lines.
+            font_size (float, optional): The font size of the cells. Defaults to 13.
+            padding (float, optional): The padding around the text of a cell. Defaults to 4.
+            max_column_width (float, optional): Columns wider than this wrap their text. Defaults to 320.
+        """
+        self.font_size = font_size
+        self.padding = padding
+        self.line_height = font_size * 1.25
+        self.max_column_width = max_column_width
+
+        widths = [text_width(h, font_size, bold=True) for h in headers]
+        line_count, row_count = 0, 0
+        for row in rows:
+            row_count += 1
+            lines = 1
+            for c, value in enumerate(fit_row(row, len(widths))):
+                cell = cell_lines(value)
+                lines = max(lines, len(cell))
+                widths[c] = max(widths[c], max(text_width(line, font_size) for line in cell))
+            line_count += lines
+
+        self.column_widths = [min(w, max_column_width) + 2 * padding for w in widths]
+        self.width = sum(self.column_widths)
+        # the height without wrapping, good enough to choose the orientation
+        self.height = (row_count + 1) * 2 * padding + (line_count + 1) * self.line_height
+
+    def wrap(self, lines: List[str], column: int, bold: bool = False) -> List[str]:
+        """ Breaks lines that do not fit into the column at spaces. """
+        limit = self.column_widths[column] - 2 * self.padding
+        wrapped = []
+        for line in lines:
+            if text_width(line, self.font_size, bold) <= limit:
+                wrapped.append(line)
+                continue
+            current = ""
+            for word in line.split(" "):
+                candidate = f"{current} {word}" if current else word
+                if current and text_width(candidate, self.font_size, bold) > limit:
+                    wrapped.append(current)
+                    current = word
+                else:
+                    current = candidate
+            wrapped.append(current)
+        return wrapped
+
+
+class TablePdfWriter:
+    def __init__(self, paper_size: Tuple[float, float], is_landscape: bool, scale: float, layout: TableLayout,
+                 title: str = "", extratitle: str = ""):
+        """
+        Writes a table as PDF without a browser, page by page.
+
+        Args:
+            paper_size (Tuple[float, float]): The portrait width and height of the paper in inches.
+            is_landscape (bool): Whether to use landscape orientation.
+            scale (float): The scale factor of the content, like the printToPDF scale.
+            layout (TableLayout): The measured table.
+            title (str, optional): The title printed above the table. Defaults to "".
+            extratitle (str, optional): The extra title printed below the title. Defaults to "".
+        """
+        width, height = paper_size
+        if is_landscape:
+            width, height = height, width
+        self.page_width = width * PT_PER_INCH
+        self.page_height = height * PT_PER_INCH
+        self.scale = scale
+        self.layout = layout
+        self.title = title
+        self.extratitle = extratitle
+
+        # points per css pixel
+        self.k = PT_PER_INCH / PX_PER_INCH * scale
+        self.margin = MARGIN * PT_PER_INCH
+        # the printable height in css pixels
+        self.body_height = (self.page_height - 2 * self.margin) / self.k
+
+    def write(self, output: BinaryIO, headers: Sequence[str], rows: Iterable, colors: Iterable = None) -> None:
+        """
+        Writes the PDF document, each page is written as soon as it is complete.
+
+        Args:
+            output (BinaryIO): A writable binary stream.
+            headers (Sequence[str]): The column headers, repeated on every page.
+            rows (Iterable): The rows, cells are strings or lists of lines.
+            colors (Iterable, optional): The background style of every cell, row by row. Defaults to None.
+        """
+        self._output = output
+        self._offset = 0
+        self._offsets = {}
+        self._pages = []
+        # 1 catalog, 2 page tree, 3 regular font, 4 bold font, pages follow
+        self._next_object = 5
+
+        self.__write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.__object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self.__object(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+
+        colors = iter(colors) if colors is not None else None
+        content = self.__start_page(headers, first=True)
+        y = content.pop()
+        for row in rows:
+            row = fit_row(row, len(headers))
+            row_colors = fit_row(next(colors), len(headers)) if colors is not None else [None] * len(row)
+            lines = [self.layout.wrap(cell_lines(value), c) for c, value in enumerate(row)]
+            row_height = max(len(cell) for cell in lines) * self.layout.line_height + 2 * self.layout.padding
+
+            # continue on a new page with the headers repeated, unless the row is too high for any page
+            if y + row_height > self.body_height and y > self.__header_height() + self.__title_height():
+                self.__finish_page(content)
+                content = self.__start_page(headers)
+                y = content.pop()
+
+            self.__row(content, y, lines, row_colors, bold=False)
+            y += row_height
+        self.__finish_page(content)
+
+        kids = b" ".join(b"%d 0 R" % page for page in self._pages)
+        self.__object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._pages)))
+        self.__object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self._offset
+        count = self._next_object
+        xref = [b"xref\n0 %d\n0000000000 65535 f \n" % count]
+        xref += [b"%010d 00000 n \n" % self._offsets[i] for i in range(1, count)]
+        self.__write(b"".join(xref))
+        self.__write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, xref_offset))
+
+    def __title_height(self) -> float:
+        height = 0
+        if self.title:
+            height += self.layout.font_size * 2
+        if self.extratitle:
+            height += self.layout.font_size * 1.5
+        return height
+
+    def __header_height(self) -> float:
+        return self.layout.line_height + 2 * self.layout.padding
+
+    def __start_page(self, headers: Sequence[str], first: bool = False) -> list:
+        # returns the content list of the page, with the current y position appended
+        content = []
+        y = 0
+        if first:
+            if self.title:
+                y += self.layout.font_size * 1.6
+                content.append(self.__text(self.title, 0, y, self.layout.font_size * 1.6, bold=True))
+                y += self.layout.font_size * 0.4
+            if self.extratitle:
+                y += self.layout.font_size * 1.2
+                content.append(self.__text(self.extratitle, 0, y, self.layout.font_size * 1.2))
+                y += self.layout.font_size * 0.3
+        header_lines = [self.layout.wrap([h], c, bold=True) for c, h in enumerate(headers)]
+        self.__row(content, y, header_lines, [None] * len(headers), bold=True, shade=True)
+        y += max([len(cell) for cell in header_lines] or [1]) * self.layout.line_height + 2 * self.layout.padding
+        content.append(y)
+        return content
+
+    def __row(self, content: list, y: float, lines: List[List[str]], row_colors: Sequence, bold: bool,
+              shade: bool = False) -> None:
+        layout = self.layout
+        height = max([len(cell) for cell in lines] or [1]) * layout.line_height + 2 * layout.padding
+        x = 0
+        for c, cell in enumerate(lines):
+            width = layout.column_widths[c]
+            fills = [(0.93, 0.93, 0.93)] if shade else background_colors(row_colors[c])
+            # several colors of a gradient are drawn as bands
+            for i, (r, g, b) in enumerate(fills):
+                band = height / len(fills)
+                content.append(b"%.3f %.3f %.3f rg %s re f" % (r, g, b, self.__rect(x, y + i * band, width, band)))
+            content.append(b"0.6 G 0.5 w %s re S" % self.__rect(x, y, width, height))
+            content.append(b"0 g")
+            for n, line in enumerate(cell):
+                if line:
+                    baseline = y + layout.padding + n * layout.line_height + layout.font_size
+                    content.append(self.__text(line, x + layout.padding, baseline, layout.font_size, bold))
+            x += width
+
+    def __rect(self, x: float, y: float, width: float, height: float) -> bytes:
+        # convert a rectangle in css pixels from the top left corner to pdf points
+        return b"%.2f %.2f %.2f %.2f" % (self.margin + x * self.k, self.page_height - self.margin - (y + height) * self.k,
+                                         width * self.k, height * self.k)
+
+    def __text(self, text: str, x: float, baseline: float, font_size: float, bold: bool = False) -> bytes:
+        return b"BT /F%d %.2f Tf %.2f %.2f Td (%s) Tj ET" % (
+            2 if bold else 1, font_size * self.k, self.margin + x * self.k,
+            self.page_height - self.margin - baseline * self.k, _escape(text))
+
+    def __finish_page(self, content: list) -> None:
+        stream = zlib.compress(b"\n".join(content))
+        content_number = self.__reserve()
+        self.__object(content_number, b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream"
+                      % (len(stream), stream))
+        page_number = self.__reserve()
+        self.__object(page_number, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+                                   b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+                      % (self.page_width, self.page_height, content_number))
+        self._pages.append(page_number)
+
+    def __reserve(self) -> int:
+        number = self._next_object
+        self._next_object += 1
+        return number
+
+    def __object(self, number: int, body: bytes) -> None:
+        self._offsets[number] = self._offset
+        self.__write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+
+    def __write(self, data: bytes) -> None:
+        self._output.write(data)
+        self._offset += len(data)
@@ -0,0 +1,142 @@
+import os, re, threading, uuid
+from typing import Dict, Tuple, Union
+
+# matches a numbered duplicate name like "Report (3).html"
+DUPLICATE_PATTERN = re.compile(r"^(?P<stem>.*) \((?P<number>\d+)\)(?P<suffix>(\.[^.]*)?)$")
+
+
+class OutputWriter:
+    def __init__(self):
+        """
+        Writes report files atomically and gives them unique names like "Report (3).html" if the name is taken.
+
+        Names are reserved by creating the file with O_CREAT | O_EXCL, so concurrent exports never claim
+        the same name. The content is written to a temporary file in the same directory and renamed over
+        the reserved file, so no partially written report is ever visible.
+        The highest duplicate number per name is indexed with one scan of each directory,
+        so a free name is found without probing every earlier duplicate.
+        """
+        # directory -> (stem, suffix) -> highest duplicate number in use
+        self._counters: Dict[str, Dict[Tuple[str, str], int]] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, output_path: str) -> str:
+        """
+        Claims the output path, or the next free numbered name if it exists, by creating an empty file.
+
+        Args:
+            output_path (str): The preferred path.
+
+        Returns:
+            str: The reserved path.
+        """
+        directory, name = os.path.split(os.path.abspath(output_path))
+        # splitext keeps dots in the name, e.g. "Plan 2024.01.html" -> ("Plan 2024.01", ".html")
+        stem, suffix = os.path.splitext(name)
+
+        with self._lock:
+            counters = self._counters.get(directory)
+            if counters is None:
+                counters = self._counters[directory] = self.__scan(directory)
+
+            if self.__create_exclusive(output_path):
+                return output_path
+
+            # continue after the highest number, another process may have taken names since the scan
+            number = counters.get((stem, suffix), 0) + 1
+            while True:
+                candidate = os.path.join(os.path.dirname(output_path), f"{stem} ({number}){suffix}")
+                if self.__create_exclusive(candidate):
+                    counters[(stem, suffix)] = number
+                    return candidate
+                number += 1
+
+    def write(self, output_path: str, data: Union[str, bytes], unique: bool = False) -> str:
+        """
+        Writes the data atomically, strings are written as UTF-8 text.
+
+        Args:
+            output_path (str): The path to write to.
+            data (Union[str, bytes]): The content.
+            unique (bool, optional): Whether to keep an existing file and write to the next free numbered name
+                instead of replacing it. Defaults to False.
+
+        Returns:
+            str: The path the data was written to.
+        """
+        if unique:
+            output_path = self.reserve(output_path)
+
+        # a replaced file keeps its mode, new files get the mode the umask allows
+        mode = None
+        if not unique:
+            try:
+                mode = os.stat(output_path).st_mode & 0o7777
+            except FileNotFoundError:
+                pass
+        fd, tmp_path = self.__create_temporary(output_path)
+        try:
+            if isinstance(data, bytes):
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+            else:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(data)
+            if mode is not None:
+                os.chmod(tmp_path, mode)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            # give the reserved name back
+            if unique and os.path.exists(output_path) and os.path.getsize(output_path) == 0:
+                os.remove(output_path)
+            raise
+        return output_path
+
+    def forget(self, directory: str = None) -> None:
+        """ Drops the index of a directory, or of all directories, so it is scanned again on the next write. """
+        with self._lock:
+            if directory is None:
+                self._counters.clear()
+            else:
+                self._counters.pop(os.path.abspath(directory), None)
+
+    @staticmethod
+    def __scan(directory: str) -> Dict[Tuple[str, str], int]:
+        counters: Dict[Tuple[str, str], int] = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    match = DUPLICATE_PATTERN.match(entry.name)
+                    if match:
+                        key = (match.group("stem"), match.group("suffix"))
+                        counters[key] = max(counters.get(key, 0), int(match.group("number")))
+        except OSError:
+            pass
+        return counters
+
+    @staticmethod
+    def __create_temporary(output_path: str) -> Tuple[int, str]:
+        # unlike mkstemp, which always uses 0600, the kernel applies the umask to the 0666 mode like open() does
+        directory, name = os.path.split(os.path.abspath(output_path))
+        while True:
+            tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:12]}.tmp")
+            try:
+                return os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0),
+                               0o666), tmp_path
+            except FileExistsError:
+                continue
+
+    @staticmethod
+    def __create_exclusive(path: str) -> bool:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        return True
+
+
+# shared by all exports of the process
+output_writer = OutputWriter()
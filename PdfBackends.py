@@ -0,0 +1,236 @@
+import base64, io, pathlib
+from contextlib import ExitStack
+from collections.abc import Sequence
+from typing import Optional, Tuple, Union
+
+from sub.DB_Table_Export.DriverPool import ChromeDriverPool, single_use_driver
+from sub.DB_Table_Export.LayoutEstimator import LayoutEstimator
+from sub.DB_Table_Export.NativePdf import TableLayout, TablePdfWriter
+from sub.DB_Table_Export.StyleInterning import apply_column_styles
+
+
+def calculate_page_setup(content_width: float, content_height: float, paper_size: Tuple[float, float],
+                         is_landscape: bool = None, scale: float = None) -> Tuple[bool, float]:
+    """
+    Chooses the orientation and scale factor for content of the given size, whichever of both is None.
+
+    Args:
+        content_width (float): The width of the content in css pixels.
+        content_height (float): The height of the content in css pixels.
+        paper_size (Tuple[float, float]): The portrait width and height of the paper in inches.
+        is_landscape (bool, optional): The orientation, calculated when None. Defaults to None.
+        scale (float, optional): The scale factor, calculated when None. Defaults to None.
+
+    Returns:
+        Tuple[bool, float]: Whether to use landscape orientation and the scale factor.
+    """
+    # add margin
+    content_width = content_width + (15 * 2)
+    content_height = content_height + (15 * 2)
+
+    if is_landscape is None:
+        if content_width > content_height:
+            is_landscape = True
+        else:
+            is_landscape = False
+
+    # add "cutoff safety" spacing of 10% the width
+    content_width += (content_width * 0.10)
+
+    # get the paper format width or height depending on the orientation, in pixels
+    # assuming 96 DPI and paper size in inches
+    paper_width = paper_size[1 if is_landscape else 0] * 96
+
+    # calculate the scale factor based on the ratio of table size and paper size
+    # assuming landscape orientation and some margin
+    calculated_scale = (paper_width - 20) / content_width
+
+    # clamp the scale factor between 0.1 and 2.0
+    calculated_scale = max(0.1, min(2.0, calculated_scale))
+
+    if scale is None:
+        scale = calculated_scale
+
+    return is_landscape, scale
+
+
+def estimate_page_setup(export, layout_estimator: Optional[LayoutEstimator], paper_format: str,
+                        is_landscape: bool = None, scale: float = None) -> Tuple[Optional[bool], Optional[float]]:
+    """
+    Predicts the orientation and scale factor of an export from its rows, whichever of both is None,
+    so a browser does not have to measure the loaded page.
+
+    Args:
+        export (DatabaseExport): The export, create_html must have been called on it.
+        layout_estimator (Optional[LayoutEstimator]): The estimator, nothing is predicted when None.
+        paper_format (str): One of the keys in the format_dict attribute of the export.
+        is_landscape (bool, optional): The orientation, predicted when None. Defaults to None.
+        scale (float, optional): The scale factor, predicted when None. Defaults to None.
+
+    Returns:
+        Tuple[Optional[bool], Optional[float]]: The orientation and scale factor, still None if they could not
+            be predicted, e.g. because the rows of the export are not a sequence.
+    """
+    if (is_landscape is None or scale is None) and layout_estimator is not None \
+            and isinstance(export.rows, Sequence) and export.display_headers is not None:
+        with export.stats.stage("layout_measurement"):
+            content_width, content_height = layout_estimator.estimate(export.template, export.display_headers,
+                                                                      export.rows)
+        is_landscape, scale = calculate_page_setup(content_width, content_height, export.format_dict[paper_format],
+                                                   is_landscape, scale)
+    return is_landscape, scale
+
+
+class PdfBackend:
+    """
+    Interface of the engines DatabaseExport.convert_html_to_pdf prints with.
+    """
+
+    def render(self, export, is_landscape: bool = None, print_background: bool = True, paper_format: str = "a4",
+               scale: float = None, html: str = None) -> Union[bytes, None]:
+        """
+        Creates the PDF document of an export.
+
+        Args:
+            export (DatabaseExport): The export, create_html must have been called on it.
+            is_landscape (bool, optional): Whether to use landscape orientation. When None, get's calculated. Defaults to None.
+            print_background (bool, optional): Whether to print background colors. Defaults to True.
+            paper_format (str, optional): One of the keys in the format_dict attribute of the export. Defaults to "a4".
+            scale (float, optional): The scale factor between 0.1 and 2. When None, get's calculated. Defaults to None.
+            html (str, optional): An HTML source to print instead of the temporary HTML file. Defaults to None.
+
+        Returns:
+            Union[bytes, None]: The PDF document, or None if the conversion failed. On success, the orientation
+                and scale it was printed with are stored in the page_setup attribute of the export.
+        """
+        raise NotImplementedError
+
+    def cache_key(self) -> tuple:
+        """
+        Returns the settings of the backend that change the printed document, part of the ReportCache key.
+
+        Returns:
+            tuple: Values with a stable repr.
+        """
+        return (type(self).__name__,)
+
+
+class ChromePdfBackend(PdfBackend):
+    def __init__(self, pool: ChromeDriverPool = None, layout_estimator: LayoutEstimator = None,
+                 load_timeout: float = 5.0):
+        """
+        Prints the rendered HTML with headless Chrome through Page.printToPDF.
+
+        Args:
+            pool (ChromeDriverPool, optional): A pool to take a warm driver from. When None, a new driver
+                is started and quit for every document. Defaults to None.
+            layout_estimator (LayoutEstimator, optional): Predicts the content size to calculate orientation and
+                scale before the browser is used, e.g. the shared LayoutEstimator.layout_estimator. Its generic
+                TemplateMetrics may choose a different scale than the real template, so by default, or if the rows
+                of the export are not a sequence, the loaded page is measured instead. Defaults to None.
+            load_timeout (float, optional): Seconds to wait for the page to load before the conversion is
+                aborted. Defaults to 5.
+        """
+        self.pool = pool
+        self.layout_estimator = layout_estimator
+        self.load_timeout = load_timeout
+
+    def cache_key(self) -> tuple:
+        # the estimated scale depends on the template metrics
+        return (type(self).__name__, None if self.layout_estimator is None else self.layout_estimator.cache_key())
+
+    def render(self, export, is_landscape: bool = None, print_background: bool = True, paper_format: str = "a4",
+               scale: float = None, html: str = None) -> Union[bytes, None]:
+        # selenium is only loaded by exports that print with Chrome
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+        # predict the params if None is passed, so the page does not have to be measured
+        is_landscape, scale = estimate_page_setup(export, self.layout_estimator, paper_format, is_landscape, scale)
+
+        # take a warm driver from the pool if one is given, else start a single use driver
+        driver_context = self.pool.driver() if self.pool is not None else single_use_driver()
+        with ExitStack() as stack:
+            with export.stats.stage("driver_startup"):
+                driver = stack.enter_context(driver_context)
+
+            with export.stats.stage("page_load"):
+                if html is None:
+                    # set current site to the generated html file, chrome only opens paths as file urls
+                    driver.get(pathlib.Path(export.tmp_html_path).resolve().as_uri())
+                else:
+                    # replace the content of a blank page with the html source
+                    driver.get("about:blank")
+                    frame_id = driver.execute_cdp_cmd("Page.getFrameTree", {})["frameTree"]["frame"]["id"]
+                    driver.execute_cdp_cmd("Page.setDocumentContent", {"frameId": frame_id, "html": html})
+
+                # wait for it to load
+                try:
+                    WebDriverWait(driver, self.load_timeout).until(EC.presence_of_element_located((By.ID, 'loaded')))
+                    print("    HTML page successfully loaded")
+                except TimeoutException:
+                    print("    Loading took too much time")
+                    print("    Aborting...")
+                    return None
+
+            # calculate params if None is passed
+            if is_landscape is None or scale is None:
+                with export.stats.stage("layout_measurement"):
+                    # get the size of the table element
+                    content_size = driver.find_element(By.CLASS_NAME, "content").size
+                is_landscape, scale = calculate_page_setup(content_size["width"], content_size["height"],
+                                                           export.format_dict[paper_format], is_landscape, scale)
+
+            # set parameters for pdf conversion
+            params = {'landscape': is_landscape, 'printBackground': print_background, 'scale': scale,
+                      'paperWidth': export.format_dict[paper_format][0],
+                      'paperHeight': export.format_dict[paper_format][1]}
+
+            # perform pdf conversion, the result is only decoded once here
+            with export.stats.stage("print_to_pdf"):
+                pdf = driver.execute_cdp_cmd("Page.printToPDF", params)
+            export.page_setup = (is_landscape, scale)
+            return base64.b64decode(pdf['data'])
+
+
+class NativePdfBackend(PdfBackend):
+    def __init__(self, font_size: float = 13, padding: float = 4):
+        """
+        Writes plain table reports directly from the headers, rows and cell colors, without a browser.
+
+        The layout only follows the table structure, not the CSS of the template.
+
+        Args:
+            font_size (float, optional): The font size of the cells in css pixels. Defaults to 13.
+            padding (float, optional): The padding of the cells in css pixels. Defaults to 4.
+        """
+        self.font_size = font_size
+        self.padding = padding
+
+    def cache_key(self) -> tuple:
+        return (type(self).__name__, self.font_size, self.padding)
+
+    def render(self, export, is_landscape: bool = None, print_background: bool = True, paper_format: str = "a4",
+               scale: float = None, html: str = None) -> Union[bytes, None]:
+        output = io.BytesIO()
+        self.write(export, output, is_landscape, print_background, paper_format, scale)
+        return output.getvalue()
+
+    def write(self, export, output, is_landscape: bool = None, print_background: bool = True,
+              paper_format: str = "a4", scale: float = None) -> None:
+        """ Writes the PDF document page by page to a binary stream, see PdfBackend.render for the arguments. """
+        paper_size = export.format_dict[paper_format]
+        with export.stats.stage("layout_measurement"):
+            layout = TableLayout(export.display_headers, export.rows, self.font_size, self.padding)
+        is_landscape, scale = calculate_page_setup(layout.width, layout.height, paper_size, is_landscape, scale)
+
+        colors = export.rows_addition_data if print_background else None
+        # with interned styles the column styles, e.g. holidays, only exist in the generated css
+        if print_background and export.intern_styles and export.column_styles:
+            colors = apply_column_styles(colors, export.column_styles, len(export.rows), len(export.display_headers))
+        writer = TablePdfWriter(paper_size, is_landscape, scale, layout, export.title, export.extratitle)
+        with export.stats.stage("pdf_write"):
+            writer.write(output, export.display_headers, export.rows, colors)
+        export.page_setup = (is_landscape, scale)
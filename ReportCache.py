@@ -0,0 +1,165 @@
+import os, hashlib, tempfile, threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+# default location of the cache, shared by all processes of the user
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "dbexport_report_cache")
+
+
+def report_key(*parts, rows: Iterable = None) -> str:
+    """
+    Returns the sha256 hex digest of the given values, used as a content address in the ReportCache.
+
+    Args:
+        *parts: Values with a stable repr, e.g. strings, numbers, None, tuples and lists of them.
+        rows (Iterable, optional): Large collections, hashed row by row instead of building one big repr. Defaults to None.
+
+    Returns:
+        str: The hex digest.
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(repr(part).encode("utf-8"))
+        hasher.update(b"\x1f")
+    if rows is not None:
+        for row in rows:
+            hasher.update(repr(row).encode("utf-8"))
+            hasher.update(b"\x1e")
+    return hasher.hexdigest()
+
+
+class ReportCache:
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Stores generated HTML and PDF documents on disk by a hash of everything they were created from,
+        so exporting unchanged data again skips rendering and printing.
+
+        The least recently used documents are removed once the cache grows above max_bytes.
+
+        Args:
+            directory (str, optional): The directory of the cached documents. Defaults to DEFAULT_CACHE_DIR.
+            max_bytes (int, optional): The maximum total size of the cached documents. Defaults to 256 MiB.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # file name -> size, ordered from least to most recently used
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.__load_index()
+
+    def get(self, key: str, kind: str) -> Optional[bytes]:
+        """
+        Returns the cached document, or None on a miss.
+
+        Args:
+            key (str): The content address, see report_key.
+            kind (str): The document type, e.g. "html" or "pdf".
+
+        Returns:
+            Optional[bytes]: The document.
+        """
+        name = f"{key}.{kind}"
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+                self.__forget(name)
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if name in self._entries:
+                self._entries.move_to_end(name)
+            else:
+                # written by another process
+                self._entries[name] = len(data)
+                self._size += len(data)
+        # keep the order across processes, the index is seeded by modification time
+        try:
+            os.utime(os.path.join(self.directory, name))
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, kind: str, data: bytes) -> None:
+        """
+        Stores a document and evicts the least recently used ones if the cache got too big.
+
+        Args:
+            key (str): The content address, see report_key.
+            kind (str): The document type, e.g. "html" or "pdf".
+            data (bytes): The document.
+        """
+        if len(data) > self.max_bytes:
+            return
+
+        name = f"{key}.{kind}"
+        # write to a temporary file first, so concurrent readers never see a partial document
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self.__forget(name)
+            self._entries[name] = len(data)
+            self._size += len(data)
+            self.__evict()
+
+    def stats(self) -> Dict[str, int]:
+        """ Returns the hit and miss counters, the number of cached documents and their total size in bytes. """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._size}
+
+    def clear(self) -> None:
+        """ Removes all cached documents and resets the counters. """
+        with self._lock:
+            for name in self._entries:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __load_index(self) -> None:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self._size += size
+        self.__evict()
+
+    def __forget(self, name: str) -> None:
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._size -= size
+
+    def __evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
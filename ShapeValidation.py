@@ -0,0 +1,159 @@
+from collections.abc import Sequence, Sized
+from typing import Iterable, Iterator, Tuple
+
+
+class ShapeMismatchError(TypeError):
+    def __init__(self, index: Tuple[int, ...], message: str = None):
+        """
+        Raised when the rows and the rows_addition_data of a report have different shapes.
+
+        Args:
+            index (Tuple[int, ...]): The position of the first mismatch, e.g. (row,) if one collection ran out of rows
+                or (row, column) if a row ran out of cells first.
+            message (str, optional): The error message. Defaults to a message naming the index.
+        """
+        self.index = index
+        super().__init__(message or f"The collections have different shapes at index {list(index)}")
+
+
+def is_nested(value) -> bool:
+    """ Whether the value is a collection whose shape is checked, strings count as single values. """
+    if isinstance(value, (str, bytes, bytearray)):
+        return False
+    if isinstance(value, Sequence):
+        return True
+    # array-likes, e.g. numpy arrays, which are not registered as Sequence
+    shape = getattr(value, "shape", None)
+    return isinstance(shape, tuple) and len(shape) > 0
+
+
+def check_same_shape(collection1, collection2, depth: int = None) -> None:
+    """
+    Checks that two collections have the same shape up to a certain depth, without recursion.
+
+    The shape of a collection is defined by its length and the length of its nested collections.
+    Any sequence or array-like is accepted. Array-likes with a shape attribute, e.g. 2-D numpy arrays,
+    are compared by their shapes without iterating over them.
+
+    Args:
+        collection1: A sequence or array-like.
+        collection2: A sequence or array-like.
+        depth (int, optional): The number of nested levels to check below the collections themselves.
+            When None, the whole collections are checked. Defaults to None.
+
+    Raises:
+        ShapeMismatchError: At the first position where the shapes differ.
+        ValueError: If either collection is not a sequence or array-like, or if depth is not a positive integer or None.
+    """
+    if not is_nested(collection1) or not is_nested(collection2):
+        raise ValueError("Invalid collections")
+    if depth is not None and (not isinstance(depth, int) or depth < 0):
+        raise ValueError("Invalid depth")
+
+    # fast path for arrays, whose nested lengths are fixed by their shape
+    shape1, shape2 = getattr(collection1, "shape", None), getattr(collection2, "shape", None)
+    if isinstance(shape1, tuple) and isinstance(shape2, tuple):
+        levels = None if depth is None else depth + 1
+        # object arrays may hold nested collections below their shape
+        leaf_values = getattr(getattr(collection1, "dtype", None), "kind", "O") != "O" and \
+            getattr(getattr(collection2, "dtype", None), "kind", "O") != "O"
+        if leaf_values or (levels is not None and levels <= min(len(shape1), len(shape2))):
+            __compare_shapes(shape1[:levels], shape2[:levels])
+            return
+
+    if len(collection1) != len(collection2):
+        raise ShapeMismatchError((min(len(collection1), len(collection2)),))
+    if depth == 0:
+        return
+
+    # depth first over the nested collections, one iterator per level instead of one call per element
+    stack = [((), enumerate(zip(collection1, collection2)), depth)]
+    while stack:
+        path, items, remaining = stack[-1]
+        child_remaining = None if remaining is None else remaining - 1
+        for i, (item1, item2) in items:
+            nested1, nested2 = is_nested(item1), is_nested(item2)
+            if nested1 != nested2:
+                raise ShapeMismatchError(path + (i,))
+            if not nested1:
+                continue
+            if len(item1) != len(item2):
+                raise ShapeMismatchError(path + (i, min(len(item1), len(item2))))
+            if child_remaining != 0:
+                stack.append((path + (i,), enumerate(zip(item1, item2)), child_remaining))
+                break
+        else:
+            stack.pop()
+
+
+def __compare_shapes(shape1: tuple, shape2: tuple) -> None:
+    for level, (length1, length2) in enumerate(zip(shape1, shape2)):
+        if length1 != length2:
+            # all collections of a level have the same length, so the first one already differs
+            raise ShapeMismatchError((0,) * level + (min(length1, length2),))
+    if len(shape1) != len(shape2):
+        raise ShapeMismatchError((0,) * min(len(shape1), len(shape2)))
+
+
+def strict_zip(*iterables: Iterable, path: Tuple[int, ...] = ()) -> Iterator[tuple]:
+    """
+    Like zip, but raises a ShapeMismatchError if one of the iterables runs out before the others.
+
+    Iterables with a length are compared up front and paired with the builtin zip,
+    only lazy iterables are checked item by item.
+
+    Args:
+        *iterables (Iterable): The iterables to pair, they may be lazy like a database cursor.
+        path (Tuple[int, ...], optional): The position of the iterables, prepended to the index of a mismatch. Defaults to ().
+
+    Raises:
+        ShapeMismatchError: When the iterables have different lengths.
+    """
+    if all(isinstance(i, Sized) for i in iterables):
+        lengths = [len(i) for i in iterables]
+        if lengths and min(lengths) != max(lengths):
+            raise ShapeMismatchError(path + (min(lengths),))
+        return zip(*iterables)
+    return _strict_zip_lazy(iterables, path)
+
+
+def _strict_zip_lazy(iterables: Tuple[Iterable, ...], path: Tuple[int, ...]) -> Iterator[tuple]:
+    sentinel = object()
+    iterators = [iter(i) for i in iterables]
+    index = 0
+    while True:
+        items = tuple(next(i, sentinel) for i in iterators)
+        if all(item is sentinel for item in items):
+            return
+        if any(item is sentinel for item in items):
+            raise ShapeMismatchError(path + (index,))
+        yield items
+        index += 1
+
+
+class ShapeValidator:
+    def __init__(self, rows: Iterable):
+        """
+        Checks the shapes of the rows and the rows_addition_data while a template renders them, so no
+        separate pass over the data is needed and lazy rows are supported.
+
+        Pass the zip method as zip to the template. Zipping the rows pairs them strictly row by row,
+        zipping the cells of a row strictly cell by cell, and a mismatch is reported with its row and column.
+        Rows and cells with a length are compared by their lengths, see strict_zip.
+
+        Args:
+            rows (Iterable): The rows as passed to the template, used to tell the row level from the cell level.
+        """
+        self.rows = rows
+        self.row_index = None
+
+    def zip(self, *iterables: Iterable) -> Iterator[tuple]:
+        if any(iterable is self.rows for iterable in iterables):
+            return self.__zip_rows(iterables)
+        return strict_zip(*iterables, path=() if self.row_index is None else (self.row_index,))
+
+    def __zip_rows(self, iterables) -> Iterator[tuple]:
+        for index, items in enumerate(strict_zip(*iterables)):
+            self.row_index = index
+            yield items
+        self.row_index = None
@@ -0,0 +1,97 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+# cell styles equal to the default white background, such cells get no class
+DEFAULT_STYLES = frozenset(["", "background-color: #FFFFFF;"])
+
+
+class InternedStyles(NamedTuple):
+    """ The distinct cell styles of a report as css rules, and the class of each cell. """
+    # rules for a <style> block, one per distinct style
+    css: str
+    # class name per cell with the shape of the styles, empty for default cells
+    classes: List[List[str]]
+
+
+def important(style: str) -> str:
+    """ Marks every declaration of a style as !important, so the class wins over the template css like an inline style. """
+    declarations = [declaration.strip() for declaration in style.split(";") if declaration.strip()]
+    return " ".join(f"{declaration} !important;" for declaration in declarations)
+
+
+def column_rules(column_styles: Dict[int, str]) -> str:
+    """
+    Returns css rules styling whole columns of the table body, e.g. holidays of a weekplan.
+
+    The selector is more specific than the generated cell classes, so a column style wins over a cell style.
+
+    Args:
+        column_styles (Dict[int, str]): The css declarations by zero based column index.
+
+    Returns:
+        str: The css rules.
+    """
+    return "\n".join(f"tr > td:nth-child({j + 1}) {{ {important(style)} }}"
+                     for j, style in sorted(column_styles.items()))
+
+
+def apply_column_styles(rows_addition_data: Optional[List[List[Optional[str]]]], column_styles: Dict[int, str],
+                        row_count: int, column_count: int) -> List[List[Optional[str]]]:
+    """
+    Returns a copy of the cell styles with the column styles set on every cell of their columns,
+    for templates that only support inline styles.
+
+    Args:
+        rows_addition_data (Optional[List[List[Optional[str]]]]): The cell styles, they are not changed.
+            When None, empty styles are used.
+        column_styles (Dict[int, str]): The css declarations by zero based column index.
+        row_count (int): The number of rows.
+        column_count (int): The number of columns.
+
+    Returns:
+        List[List[Optional[str]]]: The new cell styles.
+    """
+    if rows_addition_data is None:
+        styled = [[""] * column_count for _ in range(row_count)]
+    else:
+        styled = [list(row) for row in rows_addition_data]
+    for row in styled:
+        for j, style in column_styles.items():
+            if j < len(row):
+                row[j] = style
+    return styled
+
+
+def intern_cell_styles(rows_addition_data: Iterable[Iterable[Optional[str]]], column_styles: Dict[int, str] = None,
+                       prefix: str = "c") -> InternedStyles:
+    """
+    Replaces the inline style of every cell with a short generated class, one class per distinct style,
+    so repeated colors and gradients are written once in a <style> block instead of once per cell.
+
+    Args:
+        rows_addition_data (Iterable[Iterable[Optional[str]]]): The css declarations of the cells row by row,
+            e.g. "background-color: #FF0000;" or a linear-gradient.
+        column_styles (Dict[int, str], optional): Styles of whole columns, added as column rules, see column_rules.
+            Defaults to None.
+        prefix (str, optional): The prefix of the generated class names. Defaults to "c".
+
+    Returns:
+        InternedStyles: The css rules and the class of each cell.
+    """
+    names: Dict[str, str] = {}
+    classes = []
+    for row in rows_addition_data:
+        row_classes = []
+        for style in row:
+            if not style or style in DEFAULT_STYLES:
+                row_classes.append("")
+                continue
+            name = names.get(style)
+            if name is None:
+                name = names[style] = f"{prefix}{len(names):x}"
+            row_classes.append(name)
+        classes.append(row_classes)
+
+    css = "\n".join(f"td.{name} {{ {important(style)} }}" for style, name in names.items())
+    if column_styles:
+        css = f"{css}\n{column_rules(column_styles)}" if css else column_rules(column_styles)
+    return InternedStyles(css, classes)
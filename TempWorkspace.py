@@ -0,0 +1,59 @@
+import os, shutil, tempfile, weakref
+from typing import Set
+
+# workspaces whose files are still needed by an external viewer, removed at interpreter exit
+_deferred_workspaces: Set["TempWorkspace"] = set()
+
+
+def _remove_workspace(path: str) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class TempWorkspace:
+    def __init__(self, prefix: str = "dbexport_", keep: bool = False, base_dir: str = None):
+        """
+        Creates a private temporary directory for the intermediate files of one export.
+
+        The directory is created with tempfile.mkdtemp, so its name is unique across threads and processes.
+        It is removed when cleanup is called, when the workspace is garbage collected or at interpreter exit.
+
+        Args:
+            prefix (str, optional): The prefix of the directory name. Defaults to "dbexport_".
+            keep (bool, optional): Whether to keep the files after the export, useful for debugging. Defaults to False.
+            base_dir (str, optional): The directory to create the workspace in. When None, the system
+                temp directory is used. Defaults to None.
+        """
+        self.path = tempfile.mkdtemp(prefix=prefix, dir=base_dir)
+        self.keep = keep
+
+        self._finalizer = weakref.finalize(self, _remove_workspace, self.path)
+        if keep:
+            self._finalizer.detach()
+            print(f"    keeping temporary files in {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.cleanup()
+
+    def file(self, name: str) -> str:
+        """
+        Returns the absolute path of a file inside the workspace.
+
+        Args:
+            name (str): The file name.
+
+        Returns:
+            str: The absolute path to the file.
+        """
+        return os.path.join(self.path, name)
+
+    def cleanup(self) -> None:
+        """ Removes the workspace and its files, unless it was created with keep. """
+        _deferred_workspaces.discard(self)
+        self._finalizer()
+
+    def defer_cleanup(self) -> None:
+        """ Keeps the files until interpreter exit, for files that were handed to an external viewer. """
+        _deferred_workspaces.add(self)
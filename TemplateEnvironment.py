@@ -0,0 +1,136 @@
+import os, hashlib, threading, jinja2
+from typing import Dict, List, Optional, Tuple
+
+from sub.DB_Table_Export.AssetInliner import asset_cache, asset_references
+
+
+class TemplateEnvironment:
+    def __init__(self, search_path: str = "./", use_bytecode_cache: bool = True, bytecode_cache_dir: str = None):
+        """
+        Initializes a jinja2 environment that keeps compiled templates across exports.
+
+        Templates are cached by path and modification time, so edited templates are picked up on the next export.
+        The compiled bytecode is additionally stored on disk, so a new process does not recompile unchanged templates.
+        Templates can embed assets themselves with the inline_css(path) and inline_image(path) globals.
+
+        Args:
+            search_path (str, optional): The directory the template names are relative to. Defaults to "./".
+            use_bytecode_cache (bool, optional): Whether to store compiled templates on disk. Defaults to True.
+            bytecode_cache_dir (str, optional): The directory of the bytecode cache. When None, jinja2 uses a
+                per-user directory in the system temp directory. Defaults to None.
+        """
+        self.search_path = os.path.abspath(search_path)
+
+        bytecode_cache = None
+        if use_bytecode_cache:
+            if bytecode_cache_dir is not None:
+                os.makedirs(bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_cache_dir)
+
+        self.environment = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(self.search_path),
+            bytecode_cache=bytecode_cache
+        )
+        self.environment.globals["inline_css"] = asset_cache.css
+        self.environment.globals["inline_image"] = asset_cache.image_data_uri
+
+        # template name -> (modification time in ns, compiled template)
+        self._templates: Dict[str, Tuple[int, jinja2.Template]] = {}
+        # template name -> (modification time in ns, sha256 of the source, referenced asset paths)
+        self._sources: Dict[str, Tuple[int, str, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def get_template(self, template_name: str) -> jinja2.Template:
+        """
+        Returns the compiled template, compiling it only if it is new or was modified since the last call.
+
+        Args:
+            template_name (str): The path of the template relative to the search path.
+
+        Returns:
+            jinja2.Template: The compiled template.
+        """
+        mtime = os.stat(os.path.join(self.search_path, template_name)).st_mtime_ns
+
+        cached = self._templates.get(template_name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with self._lock:
+            # load through the loader directly, it consults the bytecode cache by source checksum
+            template = self.environment.loader.load(self.environment, template_name,
+                                                    self.environment.make_globals(None))
+            self._templates[template_name] = (mtime, template)
+        return template
+
+    def checksum(self, template_name: str) -> str:
+        """
+        Returns the sha256 hex digest of the template source, it is only recomputed when the file was modified.
+
+        Args:
+            template_name (str): The path of the template relative to the search path.
+
+        Returns:
+            str: The hex digest.
+        """
+        return self.__source_info(template_name)[1]
+
+    def asset_stamps(self, template_name: str) -> List[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Returns the modification time and size of the stylesheets and images the template embeds,
+        so a cached report can be told apart from one rendered with edited assets.
+
+        Args:
+            template_name (str): The path of the template relative to the search path.
+
+        Returns:
+            List[Tuple[str, Optional[int], Optional[int]]]: See AssetCache.stamps.
+        """
+        return asset_cache.stamps(self.__source_info(template_name)[2])
+
+    def __source_info(self, template_name: str) -> Tuple[int, str, List[str]]:
+        path = os.path.join(self.search_path, template_name)
+        mtime = os.stat(path).st_mtime_ns
+
+        cached = self._sources.get(template_name)
+        if cached is not None and cached[0] == mtime:
+            return cached
+
+        with open(path, "rb") as f:
+            source = f.read()
+        info = (mtime, hashlib.sha256(source).hexdigest(), asset_references(source.decode("utf-8", "replace")))
+        with self._lock:
+            self._sources[template_name] = info
+        return info
+
+    def clear(self) -> None:
+        """ Drops all compiled templates held in memory. """
+        with self._lock:
+            self._templates.clear()
+            self._sources.clear()
+            self.environment.cache.clear()
+
+
+# search path and bytecode settings -> shared environment
+_environments: Dict[Tuple[str, bool, Optional[str]], TemplateEnvironment] = {}
+_environments_lock = threading.Lock()
+
+
+def get_environment(search_path: str = "./", use_bytecode_cache: bool = True,
+                    bytecode_cache_dir: str = None) -> TemplateEnvironment:
+    """
+    Returns the shared TemplateEnvironment for the given settings, creating it on first use.
+
+    Args:
+        search_path (str, optional): The directory the template names are relative to. Defaults to "./".
+        use_bytecode_cache (bool, optional): Whether to store compiled templates on disk. Defaults to True.
+        bytecode_cache_dir (str, optional): The directory of the bytecode cache. Defaults to None.
+
+    Returns:
+        TemplateEnvironment: The shared environment.
+    """
+    key = (os.path.abspath(search_path), use_bytecode_cache, bytecode_cache_dir)
+    with _environments_lock:
+        if key not in _environments:
+            _environments[key] = TemplateEnvironment(search_path, use_bytecode_cache, bytecode_cache_dir)
+        return _environments[key]
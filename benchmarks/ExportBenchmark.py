@@ -0,0 +1,406 @@
+import argparse, contextlib, datetime, gc, io, json, os, platform, random, statistics, subprocess, sys, time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from sub.DB_Table_Export import REPORT_TYPES
+from sub.DB_Table_Export.ColorMatcher import InstructorColorMatcher
+from sub.DB_Table_Export.DBExport import DatabaseExport
+from sub.DB_Table_Export.DevToolsBackend import DevToolsPdfBackend, find_chrome
+from sub.DB_Table_Export.HeadlessExport import read_cursor
+from sub.DB_Table_Export.PdfBackends import NativePdfBackend
+from sub.DB_Table_Export.TemplateEnvironment import TemplateEnvironment
+from sub.DB_Table_Export.report_data import TEMPLATES
+
+# Benchmarks of the export pipeline on synthetic table and weekplan reports, see the README for the usage
+
+# the bundled templates mirror the paths of the report templates, pass --project-root to use the real ones
+BENCHMARK_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_ROWS = [100, 1000, 10000]
+DEFAULT_COLUMNS = [5, 20]
+FULL_ROWS = [100, 1000, 10000, 50000, 200000]
+FULL_COLUMNS = [5, 20, 60]
+
+# instructor names, cells containing them are colored by the matcher
+INSTRUCTORS = ["Huber", "Gruber", "Bauer", "Wagner", "Müller", "Pichler", "Steiner", "Moser", "Mayer", "Hofer",
+               "Leitner", "Berger", "Fuchs", "Eder", "Fischer", "Schmid", "Winkler", "Weber", "Schwarz", "Maier"]
+# dependencies of single backends or of the GUI, which the headless HTML path must not load
+HEAVY_MODULES = ["selenium", "chromedriver_autoinstaller_fix", "bs4", "lxml", "PyQt5", "holidays", "pypdf",
+                 "websockets", "definitions"]
+
+# code run in a fresh interpreter per import check, the export runs in the directory of the bundled templates
+IMPORT_CHECKS = {
+    "import_dbexport": "import sub.DB_Table_Export.DBExport",
+    "import_headless": "import sub.DB_Table_Export.HeadlessExport",
+    "headless_html_export": "import sqlite3, tempfile\n"
+                            "from sub.DB_Table_Export import REPORT_TYPES\n"
+                            "from sub.DB_Table_Export.HeadlessExport import export_from_query\n"
+                            "with tempfile.TemporaryDirectory() as output_dir:\n"
+                            "    export_from_query(sqlite3.connect(':memory:'), \"SELECT 'Huber' AS name\",\n"
+                            "                      REPORT_TYPES.REPORT_TABLE, 'imports', output_dir, pdf=False,\n"
+                            "                      with_colors=False)",
+}
+
+_IMPORT_SCRIPT = "import json, sys, time\nstart = time.perf_counter()\n{code}\n" \
+                 "print(json.dumps({{'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}}))"
+
+WORDS = ["Werkstatt", "Theorie", "Praxis", "Elektro", "Metall", "CNC", "Schweißen", "Prüfung", "Projekt", "Labor",
+         "Montage", "Wartung", "Büro", "Lager", "Sicherheit", "Kurs", "Übung", "Teamarbeit", "", ""]
+
+
+class Dataset(NamedTuple):
+    name: str
+    report_type: REPORT_TYPES
+    headers: List[str]
+    # raw cell texts, like the table widget or a database cursor returns them
+    texts: List[List[str]]
+    color_dict: Optional[Dict[str, str]]
+
+
+class BenchmarkResult(NamedTuple):
+    dataset: str
+    benchmark: str
+    repeats: int
+    # seconds
+    min: float
+    median: float
+
+
+class FakeCursor:
+    def __init__(self, headers: List[str], records: List[List[str]]):
+        """ A DB-API like cursor over records in memory, so the extraction can be measured without a database. """
+        self.description = [(header, None, None, None, None, None, None) for header in headers]
+        self._records = records
+        self._position = 0
+
+    def fetchmany(self, size: int) -> List[List[str]]:
+        batch = self._records[self._position:self._position + size]
+        self._position += len(batch)
+        return batch
+
+
+def make_color_dict() -> Dict[str, str]:
+    rnd = random.Random(0)
+    return {name: "#{:06X}".format(rnd.randrange(0x1000000)) for name in INSTRUCTORS}
+
+
+def make_dataset(report_type: REPORT_TYPES, row_count: int, column_count: int, with_colors: bool,
+                 seed: int = 0) -> Dataset:
+    """
+    Generates a reproducible report. Table cells hold a word or an instructor name, weekplan cells hold several lines,
+    about every third cell mentions one or two instructors.
+
+    Args:
+        report_type (REPORT_TYPES): The report type.
+        row_count (int): The number of rows.
+        column_count (int): The number of columns.
+        with_colors (bool): Whether the cells are colored by instructor colors.
+        seed (int, optional): The seed of the generator. Defaults to 0.
+
+    Returns:
+        Dataset: The generated report.
+    """
+    rnd = random.Random(seed)
+    is_weekplan = report_type == REPORT_TYPES.REPORT_WEEKPLAN
+
+    def cell() -> str:
+        if rnd.random() < 0.33:
+            # names only match when enclosed by separators, like "Praxis / Huber / Gruber /"
+            text = f"{rnd.choice(WORDS)} / {' / '.join(rnd.sample(INSTRUCTORS, rnd.randint(1, 2)))} /"
+        else:
+            text = rnd.choice(WORDS)
+        if is_weekplan:
+            text = "\n".join([text] + [rnd.choice(WORDS) for _ in range(rnd.randint(1, 3))])
+        return text
+
+    texts = [[cell() for _ in range(column_count)] for _ in range(row_count)]
+    headers = [f"Spalte {c + 1}" for c in range(column_count)]
+    name = f"{'weekplan' if is_weekplan else 'table'}-{row_count}x{column_count}-{'colors' if with_colors else 'plain'}"
+    return Dataset(name, report_type, headers, texts, make_color_dict() if with_colors else None)
+
+
+def timed(function: Callable[[], object], repeats: int) -> List[float]:
+    # the progress prints of the pipeline are not part of the measurement output
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def chrome_available() -> bool:
+    """ Whether a local Chrome or Chromium installation can be found for the PDF benchmarks. """
+    return find_chrome() is not None
+
+
+def run_dataset(dataset: Dataset, repeats: int, template_env: TemplateEnvironment, pool=None,
+                pdf_max_rows: int = 20000, devtools: DevToolsPdfBackend = None) -> List[BenchmarkResult]:
+    """
+    Runs all benchmarks on one dataset.
+
+    Args:
+        dataset (Dataset): The dataset.
+        repeats (int): How often each benchmark is run.
+        template_env (TemplateEnvironment): The environment to load the templates from.
+        pool (ChromeDriverPool, optional): The driver pool for the Chrome PDF benchmark, skipped when None. Defaults to None.
+        pdf_max_rows (int, optional): Datasets with more rows skip the Chrome PDF benchmark. Defaults to 20000.
+        devtools (DevToolsPdfBackend, optional): The backend for the DevTools PDF benchmark, skipped when None.
+            Defaults to None.
+
+    Returns:
+        List[BenchmarkResult]: One result per benchmark.
+    """
+    template = TEMPLATES[dataset.report_type]
+    is_weekplan = dataset.report_type == REPORT_TYPES.REPORT_WEEKPLAN
+
+    # prepared inputs of the single stages, like the pipeline produces them
+    matcher = InstructorColorMatcher(dataset.color_dict) if dataset.color_dict is not None else None
+    headers, rows, colors = read_cursor(FakeCursor(dataset.headers, dataset.texts), dataset.report_type, matcher)
+    if matcher is None:
+        colors = None
+    html = DatabaseExport.render_without_request(template, template_env, title=dataset.name, extratitle="",
+                                                 header=headers, rows=rows, rows_addition_data=colors, zip=zip)
+    flat_texts = [text for row in dataset.texts for text in row]
+
+    def color_matching():
+        # a new matcher, so neither its compiled pattern nor its memo is reused
+        cold_matcher = InstructorColorMatcher(dataset.color_dict)
+        for text in flat_texts:
+            if text:
+                cold_matcher.cell_style(text)
+
+    def html_end_to_end(intern_styles=False):
+        export = DatabaseExport(template, dataset.name, "", "", template_env=template_env)
+        try:
+            export.create_html(headers, rows, colors, open_file=False, save_file=False, intern_styles=intern_styles)
+        finally:
+            export.workspace.cleanup()
+
+    def pdf_end_to_end(backend=None):
+        export = DatabaseExport(template, dataset.name, "", "", template_env=template_env)
+        try:
+            export.create_html(headers, rows, colors, open_file=False, save_file=False)
+            if export.convert_html_to_pdf(open_file=False, save_file=False, pool=pool, backend=backend) is None:
+                raise TimeoutError("Loading the HTML page took too much time")
+        finally:
+            export.workspace.cleanup()
+
+    benchmarks: Dict[str, Callable[[], object]] = {
+        "render_without_request": lambda: DatabaseExport.render_without_request(
+            template, template_env, title=dataset.name, extratitle="", header=headers, rows=rows,
+            rows_addition_data=colors, zip=zip),
+        "consolidate_css_html": lambda: DatabaseExport.consolidate_css_html(html),
+        "table_extraction": lambda: read_cursor(FakeCursor(dataset.headers, dataset.texts), dataset.report_type,
+                                                matcher),
+        "html_end_to_end": html_end_to_end,
+    }
+    if dataset.color_dict is not None:
+        benchmarks["color_matching"] = color_matching
+        benchmarks["html_end_to_end_interned"] = lambda: html_end_to_end(intern_styles=True)
+        # create_html checks the first level, the full check walks every cell
+        benchmarks["check_same_shape"] = lambda: DatabaseExport.__check_same_shape__(rows, colors, 1)
+        if not is_weekplan:
+            # weekplan cells are lists of lines but have one style each, the full check would fail at the first cell
+            benchmarks["check_same_shape_full"] = lambda: DatabaseExport.__check_same_shape__(rows, colors)
+    if not is_weekplan:
+        benchmarks["pdf_native_end_to_end"] = lambda: pdf_end_to_end(NativePdfBackend())
+    if pool is not None and len(rows) <= pdf_max_rows:
+        benchmarks["pdf_chrome_end_to_end"] = pdf_end_to_end
+    if devtools is not None and len(rows) <= pdf_max_rows:
+        benchmarks["pdf_devtools_end_to_end"] = lambda: pdf_end_to_end(devtools)
+
+    results = []
+    for name, function in benchmarks.items():
+        times = timed(function, repeats)
+        results.append(BenchmarkResult(dataset.name, name, repeats, min(times), statistics.median(times)))
+        print(f"    {dataset.name:<32} {name:<24} median {statistics.median(times) * 1000:10.2f} ms")
+    return results
+
+
+def run(row_counts: Sequence[int], column_counts: Sequence[int], repeats: int = 3, project_root: str = BENCHMARK_ROOT,
+        with_pdf: bool = True, pdf_max_rows: int = 20000) -> dict:
+    """
+    Runs the benchmarks on every combination of report type, size and coloring.
+
+    Args:
+        row_counts (Sequence[int]): The row counts of the datasets.
+        column_counts (Sequence[int]): The column counts of the datasets.
+        repeats (int, optional): How often each benchmark is run. Defaults to 3.
+        project_root (str, optional): The directory the template paths and stylesheet links are relative to.
+            Defaults to the bundled benchmark templates.
+        with_pdf (bool, optional): Whether to run the Chrome PDF benchmark if Chrome is installed. Defaults to True.
+        pdf_max_rows (int, optional): Datasets with more rows skip the Chrome PDF benchmark. Defaults to 20000.
+
+    Returns:
+        dict: The JSON serializable report with the environment and the results.
+    """
+    # the stylesheets are linked relative to the project root, like in the application
+    previous_cwd = os.getcwd()
+    os.chdir(project_root)
+    template_env = TemplateEnvironment(project_root, use_bytecode_cache=False)
+
+    pool, devtools = None, None
+    if with_pdf and chrome_available():
+        from sub.DB_Table_Export.DriverPool import ChromeDriverPool
+        pool = ChromeDriverPool(size=1)
+        devtools = DevToolsPdfBackend()
+    elif with_pdf:
+        print("Chrome was not found, skipping the Chrome PDF benchmarks")
+
+    results = []
+    try:
+        for report_type in (REPORT_TYPES.REPORT_TABLE, REPORT_TYPES.REPORT_WEEKPLAN):
+            for row_count in row_counts:
+                for column_count in column_counts:
+                    for with_colors in (False, True):
+                        dataset = make_dataset(report_type, row_count, column_count, with_colors)
+                        results.extend(run_dataset(dataset, repeats, template_env, pool, pdf_max_rows, devtools))
+    finally:
+        if pool is not None:
+            pool.close()
+        if devtools is not None:
+            devtools.close()
+        os.chdir(previous_cwd)
+
+    return {"environment": {"python": platform.python_version(), "platform": platform.platform(),
+                            "processor": platform.processor(), "date": datetime.datetime.now().isoformat(),
+                            "repeats": repeats, "chrome": pool is not None},
+            "results": [result._asdict() for result in results]}
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10) -> List[dict]:
+    """
+    Compares the median times of two benchmark runs.
+
+    Args:
+        baseline (dict): The report of the earlier run.
+        current (dict): The report of the later run.
+        threshold (float, optional): The relative slowdown from which a benchmark counts as regressed. Defaults to 0.10.
+
+    Returns:
+        List[dict]: One entry per benchmark found in both runs, with the ratio of the medians and whether it regressed.
+    """
+    baseline_medians = {(r["dataset"], r["benchmark"]): r["median"] for r in baseline["results"]}
+    comparisons = []
+    for result in current["results"]:
+        key = (result["dataset"], result["benchmark"])
+        if key not in baseline_medians or baseline_medians[key] <= 0:
+            continue
+        ratio = result["median"] / baseline_medians[key]
+        comparisons.append({"dataset": key[0], "benchmark": key[1], "baseline": baseline_medians[key],
+                            "current": result["median"], "ratio": ratio, "regressed": ratio > 1 + threshold})
+    return comparisons
+
+
+def print_comparison(comparisons: List[dict]) -> None:
+    for c in comparisons:
+        flag = "REGRESSED" if c["regressed"] else ""
+        print(f"{c['dataset']:<32} {c['benchmark']:<24} {c['baseline'] * 1000:10.2f} ms -> "
+              f"{c['current'] * 1000:10.2f} ms  x{c['ratio']:.2f} {flag}")
+
+
+def check_imports(budget: float = 0.3, repeats: int = 3) -> List[dict]:
+    """
+    Runs the IMPORT_CHECKS in fresh interpreters and checks that they stay within the time budget
+    and load none of the HEAVY_MODULES.
+
+    Args:
+        budget (float, optional): The allowed seconds of the fastest run, including the export itself. Defaults to 0.3.
+        repeats (int, optional): How often each check is run, the fastest run counts. Defaults to 3.
+
+    Returns:
+        List[dict]: One entry per check, with its time, the heavy modules it loaded and whether it failed.
+    """
+    # the child interpreters find the package like this one does
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(os.path.abspath(path) for path in sys.path))
+    checks = []
+    for name, code in IMPORT_CHECKS.items():
+        seconds, modules = [], set()
+        for _ in range(repeats):
+            completed = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT.format(code=code)], cwd=BENCHMARK_ROOT,
+                                       env=env, capture_output=True, text=True)
+            if completed.returncode != 0:
+                raise RuntimeError(f"The import check {name} failed:\n{completed.stderr}")
+            # the export prints its progress before the result
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            seconds.append(result["seconds"])
+            modules.update(module.split(".")[0] for module in result["modules"])
+
+        heavy = [module for module in HEAVY_MODULES if module in modules]
+        checks.append({"check": name, "seconds": min(seconds), "heavy_modules": heavy,
+                       "failed": bool(heavy) or min(seconds) > budget})
+    return checks
+
+
+def print_import_checks(checks: List[dict]) -> None:
+    for c in checks:
+        flag = "FAILED" if c["failed"] else ""
+        print(f"{c['check']:<24} {c['seconds'] * 1000:10.2f} ms  {', '.join(c['heavy_modules'])} {flag}")
+
+
+def __int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the export pipeline on synthetic reports.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and write the results as JSON")
+    run_parser.add_argument("--output", default="benchmark_results.json", help="the JSON file to write the results to")
+    run_parser.add_argument("--rows", type=__int_list, default=None, help="comma separated row counts")
+    run_parser.add_argument("--columns", type=__int_list, default=None, help="comma separated column counts")
+    run_parser.add_argument("--full", action="store_true", help="use all sizes, up to 200000 rows and 60 columns")
+    run_parser.add_argument("--repeats", type=int, default=3, help="how often each benchmark is run")
+    run_parser.add_argument("--project-root", default=BENCHMARK_ROOT,
+                            help="the directory containing the report_template_files to benchmark")
+    run_parser.add_argument("--no-pdf", action="store_true", help="skip the Chrome PDF benchmarks")
+    run_parser.add_argument("--pdf-max-rows", type=int, default=20000, help="largest dataset printed with Chrome")
+    run_parser.add_argument("--compare", default=None, help="a previous results file to compare against")
+    run_parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown counted as regression")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("baseline", help="the results of the earlier run")
+    compare_parser.add_argument("current", help="the results of the later run")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown counted as regression")
+
+    imports_parser = subparsers.add_parser("imports", help="check the import time and dependencies of the headless path")
+    imports_parser.add_argument("--budget", type=float, default=300, help="allowed milliseconds per check")
+    imports_parser.add_argument("--repeats", type=int, default=3, help="how often each check is run")
+    args = parser.parse_args(argv)
+
+    if args.command == "imports":
+        checks = check_imports(args.budget / 1000, args.repeats)
+        print_import_checks(checks)
+        return 1 if any(c["failed"] for c in checks) else 0
+
+    if args.command == "run":
+        row_counts = args.rows or (FULL_ROWS if args.full else DEFAULT_ROWS)
+        column_counts = args.columns or (FULL_COLUMNS if args.full else DEFAULT_COLUMNS)
+        output = os.path.abspath(args.output)
+        baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+        current = run(row_counts, column_counts, args.repeats, os.path.abspath(args.project_root),
+                      not args.no_pdf, args.pdf_max_rows)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"{datetime.datetime.now()}: saved benchmark results to {output}")
+        if baseline_path is None:
+            return 0
+    else:
+        baseline_path = args.baseline
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    comparisons = compare(baseline, current, args.threshold)
+    print_comparison(comparisons)
+    # a non zero exit code lets CI fail on regressions
+    return 1 if any(c["regressed"] for c in comparisons) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
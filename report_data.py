@@ -0,0 +1,57 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from sub.DB_Table_Export import REPORT_TYPES
+from sub.DB_Table_Export.HolidayCalendar import get_calendar
+
+# Qt free helpers shared by the GUI report functionality and the headless export
+
+TEMPLATES = {REPORT_TYPES.REPORT_TABLE: "report_template_files/TEMPLATE_TABLE_REPORT.html",
+             REPORT_TYPES.REPORT_WEEKPLAN: "report_template_files/TEMPLATE_WEEKPLAN_REPORT.html"}
+
+# glyphs for the unchecked, partially checked and checked state of a checkbox cell
+CHECK_STATE_GLYPHS = {0: "☐", 1: "▣", 2: "☑"}
+
+HOLIDAY_COLOR = "background-color: #D3D3D3;"
+
+
+class TableSnapshot(NamedTuple):
+    """ A copy of the data of a table, taken in one pass over its cells, row by row as the templates expect it. """
+    headers: List[str]
+    # the cell values, strings or lists of lines for weekplans
+    rows: List[list]
+    # the background style of each cell
+    colors: List[List[str]]
+
+
+def weekplan_cell(text: str) -> List[str]:
+    # Split the cell content into individual lines on the linebreak and store them
+    return [line.strip() for line in text.splitlines()]
+
+
+def holiday_column_styles(weekdays: List, subdiv: str = None) -> Dict[int, str]:
+    """ Returns the gray holiday background per holiday column of a weekplan, as column_styles for create_html. """
+    return get_calendar("AT", subdiv).column_styles(weekdays, HOLIDAY_COLOR)
+
+
+def rmv_trailing_empty_rows_n_keep_shape(list1: Union[List[List[List[str]]], List[List[Optional[str]]]],
+                                         list2: Union[List[List[List[str]]], List[List[Optional[str]]]]) -> \
+        Tuple[Union[List[List[List[str]]], List[List[Optional[str]]]],
+              Union[List[List[List[str]]], List[List[Optional[str]]]]]:
+    """
+    The function removes trailing empty rows from two lists while preserving their original shape.
+
+    :param list1: The first input list, which can be a list of lists of lists of strings or a list of lists of optional
+    strings
+    :type list1: Union[List[List[List[str]]], List[List[Optional[str]]]]
+    :param list2: The parameter `list2` is a list of lists, where each inner list can contain either strings or `None`
+    values. It can also be a list of lists of lists, where each innermost list contains strings
+    :type list2: Union[List[List[List[str]]], List[List[Optional[str]]]]
+    :return: A tuple containing two lists, which are the modified versions of the input lists after removing any trailing
+    empty rows. The lists have the same shape as the input lists.
+    """
+
+    while (list1 and not any(list1[-1])) and (list2 and not any(list2[-1])):
+        list1.pop()
+        list2.pop()
+
+    return list1, list2
@@ -1,40 +1,48 @@
 import datetime
-import os, holidays
-import re
-from typing import Dict, Union, List, Optional, Tuple
+import os, sys
+from typing import Dict, Union, List
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QMessageBox, QTableWidget, QSpacerItem, QSizePolicy
 
 from other.database import Database
 from sub.DB_Table_Export import REPORT_TYPES
+from sub.DB_Table_Export.ColorCache import instructor_colors
+from sub.DB_Table_Export.ColorMatcher import InstructorColorMatcher
 from sub.DB_Table_Export.DBExport import DatabaseExport
+from sub.DB_Table_Export.ExportWorker import ExportWorker, start_export
 from sub.DB_Table_Export.ReportPopUp import ReportPopup
+from sub.DB_Table_Export.report_data import TEMPLATES, CHECK_STATE_GLYPHS, TableSnapshot, weekplan_cell, \
+    holiday_column_styles
 
 
 def report_functionality(parent_object: object, table: QTableWidget, report_name: str, report_type: REPORT_TYPES,
-                         scale: float = None, is_landscape: bool = None, **kwargs):
-    template = None
-    pdf_filename = ""
-    weekdays, year = None, None
+                         scale: float = None, is_landscape: bool = None, run_in_background: bool = False, **kwargs):
+    """
+    Asks for the report options and exports the table widget as HTML and/or PDF report.
 
-    if report_type == REPORT_TYPES.REPORT_TABLE:
-        template = "report_template_files/TEMPLATE_TABLE_REPORT.html"
+    With run_in_background only the table is read on the GUI thread. Rendering and printing run on the export
+    thread pool, where reports started back to back are queued. The returned ExportWorker can be used to
+    follow the progress signal or to cancel the export.
+    """
+    template = TEMPLATES.get(report_type)
+    pdf_filename = ""
+    weekdays = None
+    column_styles = None
 
-    elif report_type == REPORT_TYPES.REPORT_WEEKPLAN:
-        template = "report_template_files/TEMPLATE_WEEKPLAN_REPORT.html"
+    if report_type == REPORT_TYPES.REPORT_WEEKPLAN:
         is_landscape = True
 
         # check if the expected kwargs are present
-        keys = {"weekdays", "year"}  # your set of keys
+        # a year kwarg is still accepted, the years of the holidays are taken from the weekdays
+        keys = {"weekdays"}  # your set of keys
         if not keys <= kwargs.keys():  # check if keys is a subset of kwargs.keys()
 
             # raise an exception if they are not
             raise ValueError("Missing required parameters for the weekplan report type")
 
-        # get the weekdays and colnames from kwargs
+        # get the weekdays from kwargs
         weekdays = kwargs.get("weekdays")
-        year = kwargs.get("year")
 
     # Create and show a popup window for the report options
     popup = ReportPopup()
@@ -53,23 +61,28 @@ def report_functionality(parent_object: object, table: QTableWidget, report_name
     # Create a DatabaseExport object with the template, title and file names
     dbExp = DatabaseExport(template, report_name, download_path, download_path)
 
-    # Get the table headers and rows from the table widget
-    headers = __get_headers_from_table_widget(table)
-    rows = __get_rows_from_table_widget(table, report_type)
-
-    # Colour table
-    color_dict = __get_color_dict(parent_object)
-    colors_list = __create_color_list(table, color_dict)
+    # Get the table headers, rows and colours from the table widget in one pass
+    with dbExp.stats.stage("db_color_fetch"):
+        color_matcher = __get_color_matcher(parent_object)
+    with dbExp.stats.stage("table_extraction"):
+        headers, rows, colors_list = __extract_table(table, report_type, color_matcher)
 
-    colors_list, rows = __rmv_trailing_empty_rows_n_keep_shape(colors_list, rows)
-
-    # Mark holidays on WEEKPLAN report type
+    # Mark holidays on WEEKPLAN report type, the optional holiday_subdiv kwarg adds the holidays of a state
     if report_type == REPORT_TYPES.REPORT_WEEKPLAN:
-        __mark_AT_holidays(rows, colors_list, weekdays, year)
+        column_styles = holiday_column_styles(weekdays, kwargs.get("holiday_subdiv"))
+
+    if run_in_background:
+        worker = ExportWorker(dbExp, headers, rows, colors_list, result, is_landscape=is_landscape, scale=scale,
+                              column_styles=column_styles)
+        if result['save']:
+            worker.signals.finished.connect(
+                lambda html_filename, pdf_filename: __success_msgbox(result, html_filename, pdf_filename))
+        worker.signals.failed.connect(__failure_msgbox)
+        return start_export(worker)
 
     # Create an HTML file from the template, headers and rows
     html_filename = dbExp.create_html(headers, rows, colors_list, open_file=result['html'],
-                                      save_file=(result['html'] and result['save']))
+                                      save_file=(result['html'] and result['save']), column_styles=column_styles)
     # Convert the HTML file to a PDF file with a given scale factor
 
     if result['pdf']:
@@ -80,152 +93,70 @@ def report_functionality(parent_object: object, table: QTableWidget, report_name
         __success_msgbox(result, html_filename, pdf_filename)
 
 
-# Austrian holidays are determined and then marked in red in the weekly plan
-def __mark_AT_holidays(rows: List[List[List[str]]], color_list: List[List[Optional[str]]],
-                       weekdays: List, year: int):
-    austria_holidays = holidays.AT(years=int(year))  # get holidays for the given year
-    color = "background-color: #D3D3D3;"
-
-    # Check if each weekday is a holiday and if so, make it red and the background gray
-    for j, day in enumerate(weekdays):
-        if day in austria_holidays:  # use membership test instead of iterating over items
-            for i in range(len(rows)):
-                color_list[i][j] = color
-
-
-def __rmv_trailing_empty_rows_n_keep_shape(list1: Union[List[List[List[str]]], List[List[Optional[str]]]],
-                                           list2: Union[List[List[List[str]]], List[List[Optional[str]]]]) -> \
-        Tuple[Union[List[List[List[str]]], List[List[Optional[str]]]],
-              Union[List[List[List[str]]], List[List[Optional[str]]]]]:
-    """
-    The function removes trailing empty rows from two lists while preserving their original shape.
-
-    :param list1: The first input list, which can be a list of lists of lists of strings or a list of lists of optional
-    strings
-    :type list1: Union[List[List[List[str]]], List[List[Optional[str]]]]
-    :param list2: The parameter `list2` is a list of lists, where each inner list can contain either strings or `None`
-    values. It can also be a list of lists of lists, where each innermost list contains strings
-    :type list2: Union[List[List[List[str]]], List[List[Optional[str]]]]
-    :return: A tuple containing two lists, which are the modified versions of the input lists after removing any trailing
-    empty rows. The lists have the same shape as the input lists.
-    """
+def __get_color_matcher(parent_object: object) -> InstructorColorMatcher:
+    # the compiled matcher is cached together with the colors and only rebuilt when they change
+    db = Database.get_instance(parent_object)
+    return instructor_colors.matcher(db)
 
-    while (list1 and not any(list1[-1])) and (list2 and not any(list2[-1])):
-        list1.pop()
-        list2.pop()
 
-    return list1, list2
+def __get_headers_from_table_widget(table: Union[QTableWidget, QTableWidget]) -> List[str]:
+    headers = [table.horizontalHeaderItem(i).text() for i in range(table.columnCount())]
+    return headers
 
 
-def __get_color_dict(parent_object: object):
+def __extract_table(table: Union[QTableWidget, QTableWidget], report_type: REPORT_TYPES,
+                    matcher: InstructorColorMatcher) -> TableSnapshot:
     """
-    This function retrieves a dictionary of colors associated with family names from database.
-
-    :param parent_object: The parent_object parameter is an object that is passed to the function. It is used to get an
-    instance of the Database class using the get_instance method.
-    :type parent_object: object
-    :return: a dictionary where the keys are the values in the "Familienname" column of the "kat_ausbilder" table in the
-    database, and the values are the values in the "Farbe" column of the same table.
+    Reads the headers, cell values, checkbox glyphs and cell colours of the table widget in a single pass,
+    reading every cell only once. Empty rows are left out of table reports and trailing empty rows
+    are trimmed, cell values and colours always keep the same shape.
+
+    :param table: The table widget to read
+    :param report_type: The report type, weekplan cells are split into their lines
+    :param matcher: The matcher resolving cell texts to background colours
+    :return: A snapshot of the table
     """
-    db = Database.get_instance(parent_object)
-    sql = "SELECT Familienname, Farbe from kat_ausbilder"
-    cursor = db.select(sql)
-    fetch = cursor.fetchall()
-    colors_dict = dict((key, value) for key, value in fetch)
-    return colors_dict
-
+    is_weekplan = report_type == REPORT_TYPES.REPORT_WEEKPLAN
+    column_count = table.columnCount()
+    rows, colors_list = [], []
+    # number of rows up to the last row that is not empty
+    length = 0
 
-def __create_color_list(table: Union[QTableWidget, QTableWidget], color_dict: dict):
-    rows = []
+    # Iterate over each row in the table
     for r in range(table.rowCount()):
-        row = []
-        for c in range(table.columnCount()):
-            color = ""
-            cell_colors = []
-            if table.item(r, c) is not None:
-                text = table.item(r, c).text().lower()
-                # regex for 3 or 6 digit hex color
-                found_hex_values = re.findall(r"(#[\da-fA-F]{3,6})", text)
-                # search for hex values in text
-                for hex_val in found_hex_values:
-                    cell_colors.append(hex_val)
-                    continue
-
-                # if no hex values found search for instructor names
-                if not cell_colors:
-                    for color_key in color_dict.keys():
-                        tex = text.replace("\n", " ")
-                        pattern = re.compile(fr"[\s/\\]{color_key.lower()}[\s/\\]")
-                        if pattern.search(tex):
-                            text = text.replace(color_key, "")
-                            print("uff: ", color_dict.get(color_key, "#663399"))
-                            cell_colors.append(color_dict.get(color_key, "#663399"))  # DEBUG color violet: #663399
-
-                # evaluate formatted background color
-                if len(cell_colors) < 1:
-                    color = f"background-color: #FFFFFF;"
-                elif len(cell_colors) < 2:
-                    color = f"background-color: {cell_colors[0]};"
-                else:
-                    color = f"background-image: linear-gradient(to bottom right, {','.join(cell_colors)});"
-
-            row.append(color)
-        rows.append(row)
-    return rows
+        row, colors = [], []
+        # Iterate over each column in the table
+        for c in range(column_count):
+            item = table.item(r, c)
+            text, color = "", ""
+            if item is not None:
+                text = item.text()
+                color = matcher.cell_style(text)
+                # Check if an empty cell is actually a type of checkbox
+                if not text and not is_weekplan:
+                    text = CHECK_STATE_GLYPHS.get(item.data(Qt.ItemDataRole.CheckStateRole), "")
+
+            if is_weekplan:
+                # Split the cell content into individual lines on the linebreak and store them
+                row.append([sys.intern(line) for line in weekplan_cell(text)])
+            else:
+                row.append(sys.intern(text))
+            colors.append(color)
 
+        # If there is no data in the row, leave it out of table reports
+        if not is_weekplan and not any(row):
+            continue
 
-def __get_headers_from_table_widget(table: Union[QTableWidget, QTableWidget]) -> List[str]:
-    headers = [table.horizontalHeaderItem(i).text() for i in range(table.columnCount())]
-    return headers
-
+        rows.append(row)
+        colors_list.append(colors)
+        if any(row) or any(colors):
+            length = len(rows)
 
-def __get_rows_from_table_widget(table: Union[QTableWidget, QTableWidget], report_type: REPORT_TYPES) -> \
-        List[List[List[str]]]:
-    rows = []
-    # If the report type is REPORT_TABLE
-    if report_type == REPORT_TYPES.REPORT_TABLE:
-        # Iterate over each row in the table
-        for r in range(table.rowCount()):
-            row = []
-            # Iterate over each column in the table
-            for c in range(table.columnCount()):
-                item = table.item(r, c)
-                # If item is None
-                if not item:
-                    row.append("")
-                    continue
-                # If the item text is not empty
-                if item.text() != '':
-                    row.append(item.text())
-                    continue
-
-                # If the item text is empty
-                data = item.data(Qt.ItemDataRole.CheckStateRole)
-                # Check if cell is actually empty or a type of checkbox
-                row.append("☐" if data == 0 else "▣" if data == 1 else "☑" if data == 2 else "")
-            # If there is any data in the row, append it to rows
-            if any(row):
-                rows.append(row)
-
-    # If the report type is REPORT_WEEKPLAN
-    elif report_type == REPORT_TYPES.REPORT_WEEKPLAN:
-        rows = []
-        # Iterate over each row in the table
-        for r in range(table.rowCount()):
-            row = []  # Iterate over each column in the table
-            for c in range(table.columnCount()):
-                if table.item(r, c) is not None:
-                    col = table.item(r, c).text()
-                else:
-                    col = ""
-                # Split the cell content into individual lines on the linebreak and store them
-                lines = col.splitlines()
-                lines_stripped = [line.strip() for line in lines]
-                row.append(lines_stripped)
-            # If there is any data in the row, append it to rows
-            rows.append(row)
+    # trim trailing empty rows
+    del rows[length:]
+    del colors_list[length:]
 
-    return rows
+    return TableSnapshot(__get_headers_from_table_widget(table), rows, colors_list)
 
 
 def __success_msgbox(result: Dict[str, bool], html_filename: str, pdf_filename: str) -> None:
@@ -250,3 +181,12 @@ def __success_msgbox(result: Dict[str, bool], html_filename: str, pdf_filename:
     layout.addItem(horizontalSpacer, layout.rowCount(), 0, 1, layout.columnCount())
 
     x = msg.exec_()
+
+
+def __failure_msgbox(message: str) -> None:
+    msg = QMessageBox()
+    msg.setWindowTitle("Report Failed")
+    msg.setIcon(QMessageBox.Critical)
+    msg.setText("The report could not be created:")
+    msg.setInformativeText(message)
+    msg.exec_()